@@ -0,0 +1,112 @@
+"""Shared helpers for the benchmark scripts (run from OrderingBackEnd/)."""
+import statistics
+
+from sqlalchemy import delete, event, select
+
+import database
+import migrate
+import models
+
+BENCH_CATEGORY = "__bench__"
+BENCH_USER = "__bench_user__"
+
+
+def sync_engine():
+    """The engine whose cursor events see the statements of open_async_session()."""
+    if database.async_engine is not None:
+        return database.async_engine.sync_engine
+    return database.engine
+
+
+class StatementCounter:
+    """Counts SQL statements sent to the database while active."""
+
+    def __init__(self, engine=None):
+        self.engine = engine or sync_engine()
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def migrate_schema(engine):
+    """
+    migrate.upgrade, except that a new SQLite file first gets the tables
+    with BigInteger keys from models.py, where they are INTEGER on SQLite
+    so they auto-increment. The frozen baseline migration keeps BIGINT,
+    and then skips these tables.
+    """
+    if engine.dialect.name == "sqlite":
+        models.Base.metadata.create_all(
+            engine, tables=[models.User.__table__, models.Payment.__table__, models.Orders.__table__]
+        )
+    migrate.upgrade(engine)
+
+
+def summarize(latencies_ms):
+    ordered = sorted(latencies_ms)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": round(ordered[len(ordered) // 2], 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+async def create_fixtures(food_count=1):
+    """Create a throwaway category, user and food items; return (user_id, [food_ids])."""
+    await drop_fixtures()
+    db = database.open_async_session()
+    try:
+        db.add(models.Category(category_name=BENCH_CATEGORY))
+        user = models.User(username=BENCH_USER, password="-", phone_number="00000000", address="-")
+        db.add(user)
+        foods = [
+            models.FoodItem(
+                name=f"__bench_food_{i}__", price=1000 + i, description="benchmark",
+                category_name=BENCH_CATEGORY, price_to_make=500, photo="",
+            )
+            for i in range(food_count)
+        ]
+        for food in foods:
+            db.add(food)
+        await db.commit()
+        return user.user_id, [food.food_id for food in foods]
+    finally:
+        await db.close()
+
+
+async def drop_fixtures():
+    db = database.open_async_session()
+    try:
+        user_ids = select(models.User.user_id).where(models.User.username == BENCH_USER).scalar_subquery()
+        order_ids = select(models.Orders.order_id).where(models.Orders.user_id == user_ids).scalar_subquery()
+        await db.execute(delete(models.OrderDetails).where(models.OrderDetails.order_id.in_(order_ids)))
+        await db.execute(delete(models.Orders).where(models.Orders.user_id == user_ids))
+        await db.execute(delete(models.User).where(models.User.username == BENCH_USER))
+        await db.execute(delete(models.FoodItem).where(models.FoodItem.category_name == BENCH_CATEGORY))
+        await db.execute(delete(models.Category).where(models.Category.category_name == BENCH_CATEGORY))
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def dispose_engines():
+    # Async drivers keep background threads/sockets alive until disposed
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+    database.engine.dispose()
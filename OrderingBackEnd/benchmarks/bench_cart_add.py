@@ -0,0 +1,102 @@
+"""
+Statements and latency per /cart/add, plus a lost-update check.
+
+    cd OrderingBackEnd
+    python -m benchmarks.bench_cart_add --adds 500 --concurrency 20
+
+Runs against DATABASE_URL / ASYNC_DATABASE_URL (DB_MODE picks the engine)
+using throwaway fixture rows that are removed afterwards.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import func, select
+
+import cart
+import database
+import models
+from benchmarks._common import StatementCounter, create_fixtures, dispose_engines, drop_fixtures, summarize
+
+
+async def sequential_adds(user_id, food_ids, adds):
+    latencies = []
+    statements = []
+    for i in range(adds):
+        db = database.open_async_session()
+        try:
+            with StatementCounter() as counter:
+                start = time.perf_counter()
+                await cart.add_item(db, user_id, food_ids[i % len(food_ids)], 1)
+                latencies.append((time.perf_counter() - start) * 1000)
+            statements.append(counter.count)
+        finally:
+            await db.close()
+    return latencies, statements
+
+
+async def concurrent_adds(user_id, food_ids, concurrency):
+    async def one(i):
+        db = database.open_async_session()
+        try:
+            await cart.add_item(db, user_id, food_ids[i % len(food_ids)], 1)
+        finally:
+            await db.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(concurrency)))
+    return (time.perf_counter() - start) * 1000
+
+
+async def cart_state(user_id):
+    db = database.open_async_session()
+    try:
+        orders = (await db.execute(
+            select(models.Orders.order_id, models.Orders.total_food_price)
+            .where(models.Orders.user_id == user_id, models.Orders.status == "pending")
+        )).all()
+        expected = await db.scalar(
+            select(func.sum(models.OrderDetails.quantity * models.FoodItem.price))
+            .join(models.FoodItem, models.FoodItem.food_id == models.OrderDetails.food_id)
+            .join(models.Orders, models.Orders.order_id == models.OrderDetails.order_id)
+            .where(models.Orders.user_id == user_id, models.Orders.status == "pending")
+        )
+        return orders, expected or 0
+    finally:
+        await db.close()
+
+
+async def main(args):
+    user_id, food_ids = await create_fixtures(food_count=args.items)
+    try:
+        latencies, statements = await sequential_adds(user_id, food_ids, args.adds)
+        concurrent_ms = await concurrent_adds(user_id, food_ids, args.concurrency)
+        orders, expected_total = await cart_state(user_id)
+    finally:
+        await drop_fixtures()
+        await dispose_engines()
+
+    report = {
+        "db_mode": database.DB_MODE,
+        "sequential": summarize(latencies),
+        "statements_per_add": {
+            "min": min(statements),
+            "max": max(statements),
+            "mean": round(sum(statements) / len(statements), 2),
+        },
+        "concurrent": {"adds": args.concurrency, "wall_ms": round(concurrent_ms, 3)},
+        "pending_orders": len(orders),
+        "total_matches_lines": len(orders) == 1 and orders[0].total_food_price == expected_total,
+    }
+    print(json.dumps(report, indent=2))
+    if not report["total_matches_lines"]:
+        raise SystemExit("lost update: order total does not match its line items")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--adds", type=int, default=200, help="sequential adds to time")
+    parser.add_argument("--items", type=int, default=15, help="distinct food items to cycle through")
+    parser.add_argument("--concurrency", type=int, default=20, help="simultaneous adds for the same user")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,72 @@
+"""
+Latency and query count of the /cart read for a cart with many lines.
+
+    cd OrderingBackEnd
+    python -m benchmarks.bench_cart_view --lines 15 --reads 500
+
+Fails if reading the cart takes more than one statement once the menu
+catalog is warm, so the N+1 over food items cannot come back unnoticed.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import cart
+import catalog
+import database
+from benchmarks._common import StatementCounter, create_fixtures, dispose_engines, drop_fixtures, summarize
+
+MAX_STATEMENTS_PER_READ = 1
+
+
+async def main(args):
+    user_id, food_ids = await create_fixtures(food_count=args.lines)
+    try:
+        db = database.open_async_session()
+        try:
+            for food_id in food_ids:
+                await cart.add_item(db, user_id, food_id, 1)
+        finally:
+            await db.close()
+
+        # Warm the menu catalog the way the startup hook does in the app
+        db = database.open_async_session()
+        try:
+            await catalog.menu.load(db)
+        finally:
+            await db.close()
+
+        latencies = []
+        statements = []
+        for _ in range(args.reads):
+            db = database.open_async_session()
+            try:
+                with StatementCounter() as counter:
+                    start = time.perf_counter()
+                    cart_view = await cart.read_cart(db, user_id)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                statements.append(counter.count)
+            finally:
+                await db.close()
+    finally:
+        await drop_fixtures()
+        await dispose_engines()
+
+    print(json.dumps({
+        "db_mode": database.DB_MODE,
+        "lines": len(cart_view["items"]),
+        "statements_per_read": max(statements),
+        "read": summarize(latencies),
+    }, indent=2))
+    assert len(cart_view["items"]) == args.lines, "cart lost line items"
+    assert max(statements) <= MAX_STATEMENTS_PER_READ, (
+        f"reading a {args.lines}-line cart took {max(statements)} statements"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=15, help="distinct items in the cart")
+    parser.add_argument("--reads", type=int, default=200, help="cart reads to time")
+    asyncio.run(main(parser.parse_args()))
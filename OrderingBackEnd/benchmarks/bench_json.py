@@ -0,0 +1,134 @@
+"""
+Response encoding throughput (bytes/sec) of the large endpoints, FastAPI's
+default path versus fast_json.
+
+    cd OrderingBackEnd
+    python -m benchmarks.bench_json --rows 500 --repeat 200
+
+Payloads are built in memory with the endpoints' own response models, so
+no database is needed:
+
+- /orders/         "before" is FastAPI's serialize_response (re-validate,
+                   then encode) plus JSONResponse; "after" is model_response
+- /api/food/list   jsonable_encoder + json.dumps versus fast_json.dumps
+- /orders/history  the same, with include_items=true
+
+fast_json uses orjson when installed; run with and without it to compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DB_AUTO_MIGRATE", "0")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+import fast_json
+import main
+
+
+def stdlib_dumps(content):
+    # What http_cache.dumps did before fast_json
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def order_page(rows):
+    today = date.today()
+    return main.OrderPage(
+        items=[
+            main.OrderResponse(
+                order_id=i, user_id=i % 50, promo_code=None, total_food_price=1000 + i,
+                delivery_fee=5000, status="completed", order_date=today - timedelta(days=i % 30), payment_id=None,
+            )
+            for i in range(rows)
+        ],
+        next_cursor="WyIyMDI2LTEwLTE4IiwxMjNd",
+        total_estimate=rows * 10,
+    )
+
+
+def food_list(rows):
+    return {"success": True, "data": [
+        {
+            "food_id": i, "name": f"Dish number {i}", "price": 1000 + i, "description": "A house favourite " * 4,
+            "category_name": f"Category {i % 8}", "price_to_make": 400 + i, "photo": f"/images/dish_{i}.jpg",
+            "photo_variants": {
+                size: {"width": width, "height": width * 3 // 4,
+                       "webp": f"/images/variants/dish_{i}-{size}.webp", "jpeg": f"/images/variants/dish_{i}-{size}.jpg"}
+                for size, width in (("thumb", 160), ("card", 480), ("full", 1200))
+            },
+        }
+        for i in range(rows)
+    ]}
+
+
+def history_page(rows):
+    today = date.today()
+    return main.OrderHistoryPage(orders=[
+        main.OrderHistoryResponse(
+            order_id=i, order_date=today - timedelta(days=i), total_food_price=3000, delivery_fee=5000,
+            status="completed", grand_total=8000,
+            items=[main.OrderHistoryItem(food_id=j, name=f"Dish {j}", quantity=j % 3 + 1, price_per_item=1000)
+                   for j in range(3)],
+        )
+        for i in range(rows)
+    ])
+
+
+def measure(encode, repeat):
+    size = len(encode())
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode()
+    elapsed = time.perf_counter() - start
+    return {
+        "bytes": size,
+        "ms_per_response": round(elapsed / repeat * 1000, 3),
+        "mb_per_second": round(size * repeat / elapsed / 1e6, 2),
+    }
+
+
+def compare(before, after, repeat):
+    result = {"before": measure(before, repeat), "after": measure(after, repeat)}
+    result["speedup"] = round(result["after"]["mb_per_second"] / result["before"]["mb_per_second"], 2)
+    return result
+
+
+def run(args):
+    orders_route = next(route for route in main.app.routes if getattr(route, "path", None) == "/orders/")
+    page = order_page(args.rows)
+    loop = asyncio.new_event_loop()
+
+    def fastapi_default():
+        content = loop.run_until_complete(
+            serialize_response(field=orders_route.response_field, response_content=page)
+        )
+        return JSONResponse(content).body
+
+    food = food_list(args.rows)
+    history = history_page(args.rows)
+    report = {
+        "orjson": fast_json.orjson is not None,
+        "rows": args.rows,
+        "endpoints": {
+            "/orders/": compare(fastapi_default, lambda: fast_json.model_response(page).body, args.repeat),
+            "/api/food/list": compare(lambda: stdlib_dumps(food), lambda: fast_json.dumps(food), args.repeat),
+            "/orders/history": compare(lambda: stdlib_dumps(history), lambda: fast_json.dumps(history), args.repeat),
+        },
+    }
+    loop.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500, help="orders / menu items per payload")
+    parser.add_argument("--repeat", type=int, default=100, help="encodings timed per endpoint and codec")
+    run(parser.parse_args())
@@ -0,0 +1,86 @@
+"""
+Password verification throughput versus worker count, and how long the
+event loop stalls meanwhile.
+
+    cd OrderingBackEnd
+    python -m benchmarks.bench_login --logins 64 --workers 1 2 4 8
+
+Each run verifies `--logins` passwords concurrently through a fresh
+passwords.PasswordHasher, the same path /api/user/login takes. The
+"inline" row calls bcrypt on the event loop the way login used to.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import bcrypt
+
+import passwords
+
+PASSWORD = "benchmark-password"
+
+
+async def loop_lag(stop, lags):
+    """Record how late a 10ms sleep wakes up while the benchmark runs."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append((time.perf_counter() - start - 0.01) * 1000)
+
+
+async def run(verify, logins):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(loop_lag(stop, lags))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(verify() for _ in range(logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    ok = sum(1 for result in results if result is True)
+    return {
+        "logins_per_second": round(ok / elapsed, 2),
+        "rejected": sum(1 for result in results if isinstance(result, Exception)),
+        "wall_ms": round(elapsed * 1000, 3),
+        "max_loop_lag_ms": round(max(lags, default=0.0), 3),
+    }
+
+
+async def main(args):
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(args.rounds)).decode("utf-8")
+    report = {"cpu_count": os.cpu_count(), "rounds": args.rounds, "logins": args.logins, "runs": {}}
+
+    async def inline():
+        return bcrypt.checkpw(PASSWORD.encode("utf-8"), hashed.encode("utf-8"))
+
+    report["runs"]["inline"] = await run(inline, args.logins)
+
+    for workers in args.workers:
+        hasher = passwords.PasswordHasher(workers=workers, max_queue=args.logins, kind=args.executor)
+        try:
+            result = await run(lambda: hasher.verify(PASSWORD, hashed), args.logins)
+            result["stats"] = hasher.stats()
+        finally:
+            hasher.shutdown()
+        report["runs"][f"{args.executor}x{workers}"] = result
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent verifications per run")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor of the stored hash")
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument(
+        "--workers", type=int, nargs="+",
+        default=sorted({1, 2, max(1, cores // 2), cores}),
+        help="pool sizes to compare",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,326 @@
+"""
+Deterministic synthetic dataset for scale testing.
+
+    cd OrderingBackEnd
+    python -m benchmarks.dataset --orders 10000000 --users 500000 --foods 2000 --seed 1
+
+Fills DATABASE_URL with:
+- users, categories and food items
+- promo codes
+- `--orders` orders spread over the last `--days` days, each with its
+  order details and a payment
+- feedback on some delivered orders
+
+It then rebuilds the daily_item_sales rollup. The same seed on the same
+starting database gives the same rows.
+
+- Dish popularity follows a Zipf law (--zipf). The ranks are shuffled, so
+  best sellers are spread over the categories.
+- Customers are skewed too (--user-skew): a few regulars place many orders.
+- Orders per day grow over the period (--growth) and peak at weekends.
+  Order ids increase with the date, like real traffic.
+- Orders before today are delivered or cancelled; today's are spread over
+  the kitchen statuses. No pending carts are created.
+- Every user's password is --password, hashed once.
+
+Rows go in as multi-row INSERTs, --chunk-size orders per transaction, with
+MySQL's foreign key and unique checks off for the loading session. Ids
+continue after the largest existing ones, and --users 0 or --foods 0
+reuses the rows already there. A database that already has orders is
+refused unless --append, so a run doesn't mix into real data by accident.
+The change_log triggers still record every seeded order.
+"""
+import argparse
+import itertools
+import random
+import time
+from datetime import date, timedelta
+
+import bcrypt
+from sqlalchemy import func, insert, select, text
+
+import cart
+import models
+import order_status
+import rollup
+from benchmarks._common import migrate_schema
+from database import engine
+
+CATEGORIES = [
+    "Pizza", "Burgers", "Pasta", "Salads", "Sushi", "Tacos", "Curry", "Noodles",
+    "Sandwiches", "Soups", "Grill", "Seafood", "Vegan", "Breakfast", "Desserts", "Drinks",
+]
+ADJECTIVES = ["Classic", "Spicy", "Smoky", "Crispy", "Garlic", "Truffle", "Lemon", "Honey", "Herb", "Double"]
+DISHES = ["Chicken", "Beef", "Veggie", "Shrimp", "Mushroom", "Cheese", "Salmon", "Lamb", "Tofu", "Pork"]
+STREETS = ["Main St", "Oak Ave", "Pine Rd", "Cedar Ln", "Maple Dr", "Elm St", "Lake Rd", "Hill St"]
+COMMENTS = ["Great!", "Tasty and hot.", "Arrived cold.", "Too salty.", "Will order again.", "Generous portion.", ""]
+
+ITEMS_PER_ORDER, ITEMS_WEIGHTS = [1, 2, 3, 4, 5, 6], [35, 30, 18, 10, 5, 2]
+QUANTITIES, QUANTITY_WEIGHTS = [1, 2, 3], [80, 15, 5]
+STARS, STARS_WEIGHTS = [1, 2, 3, 4, 5], [3, 5, 12, 35, 45]
+PAYMENT_METHODS, PAYMENT_WEIGHTS = ["card", "cash", "wallet"], [60, 25, 15]
+# Orders placed today, still moving through the kitchen
+TODAY_STATUSES = [
+    order_status.COMPLETED, order_status.PREPARING, order_status.READY,
+    order_status.DELIVERED, order_status.CANCELLED,
+]
+TODAY_WEIGHTS = [25, 20, 15, 35, 5]
+# Share of a day's orders by weekday, Monday first
+WEEKDAY_LOAD = [0.8, 0.8, 0.9, 1.0, 1.3, 1.5, 1.2]
+
+
+def cum_zipf(count, exponent):
+    """Cumulative weights 1/rank**exponent for random.choices."""
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def orders_per_day(total, days, growth, end):
+    """(date, order count) for each day up to `end`, summing to `total`."""
+    start = end - timedelta(days=days - 1)
+    weights = [
+        (1 + growth * i / max(days - 1, 1)) * WEEKDAY_LOAD[(start + timedelta(days=i)).weekday()]
+        for i in range(days)
+    ]
+    scale = total / sum(weights)
+    # Rounding the running total keeps the sum exact
+    bounds = [round(running * scale) for running in itertools.accumulate(weights)]
+    bounds[-1] = total
+    return [(start + timedelta(days=i), count) for i, count in enumerate(b - a for a, b in zip([0] + bounds, bounds))]
+
+
+def next_id(conn, column):
+    return conn.scalar(select(func.coalesce(func.max(column), 0))) + 1
+
+
+def insert_chunks(conn, table, rows, chunk_size):
+    rows = iter(rows)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        conn.execute(insert(table), chunk)
+        conn.commit()
+
+
+def create_menu(conn, rng, args):
+    """Insert categories and food items; return [(food_id, price)] with the most popular first."""
+    if args.foods == 0:
+        foods = conn.execute(
+            select(models.FoodItem.food_id, models.FoodItem.price).order_by(models.FoodItem.food_id)
+        ).all()
+    else:
+        names = [CATEGORIES[i % len(CATEGORIES)] + (f" {i // len(CATEGORIES) + 1}" if i >= len(CATEGORIES) else "")
+                 for i in range(args.categories)]
+        existing = set(conn.scalars(select(models.Category.category_name)))
+        missing = [{"category_name": name} for name in names if name not in existing]
+        if missing:
+            conn.execute(insert(models.Category.__table__), missing)
+        conn.commit()
+
+        first = next_id(conn, models.FoodItem.food_id)
+        rows = []
+        for food_id in range(first, first + args.foods):
+            price = rng.randrange(300, 3001, 50)
+            rows.append({
+                "food_id": food_id,
+                "name": f"{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {food_id}",
+                "price": price,
+                "description": "Generated for scale testing",
+                "category_name": rng.choice(names),
+                "price_to_make": int(price * rng.uniform(0.3, 0.6)),
+                "photo": "",
+            })
+        insert_chunks(conn, models.FoodItem.__table__, rows, args.chunk_size)
+        foods = [(row["food_id"], row["price"]) for row in rows]
+
+    if not foods:
+        raise SystemExit("No food items to order; pass --foods")
+    foods = list(foods)
+    rng.shuffle(foods)
+    return foods
+
+
+def create_users(conn, rng, args):
+    """Insert users; return their ids."""
+    if args.users == 0:
+        users = conn.scalars(select(models.User.user_id).order_by(models.User.user_id)).all()
+        if not users:
+            raise SystemExit("No users to place orders; pass --users")
+        return users
+
+    hashed = bcrypt.hashpw(args.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    first = next_id(conn, models.User.user_id)
+    users = range(first, first + args.users)
+    insert_chunks(conn, models.User.__table__, (
+        {
+            "user_id": user_id,
+            "username": f"user{user_id}",
+            "password": hashed,
+            "phone_number": f"{rng.randrange(10 ** 8):08d}",
+            "address": f"{rng.randint(1, 999)} {rng.choice(STREETS)}",
+        }
+        for user_id in users
+    ), args.chunk_size)
+    return list(users)
+
+
+def create_promo_codes(conn, rng, args, days):
+    """Insert promo codes valid for a stretch of the period; return [(code, valid_from, valid_to)]."""
+    start = days[0][0]
+    first = conn.scalar(select(func.count()).select_from(models.PromoCode)) + 1
+    promos = []
+    for number in range(first, first + args.promo_codes):
+        valid_from = start + timedelta(days=rng.randrange(len(days)))
+        promos.append((f"PROMO{number:06d}", valid_from, valid_from + timedelta(days=rng.randint(7, 60))))
+    if promos:
+        conn.execute(insert(models.PromoCode.__table__), [
+            {"code": code, "discount": rng.choice([5, 10, 15, 20, 25, 30]), "valid_from": valid_from, "valid_to": valid_to}
+            for code, valid_from, valid_to in promos
+        ])
+    conn.commit()
+    return promos
+
+
+def generate_orders(rng, args, days, users, foods, promos, first_ids):
+    """Yield (payment, order, details, feedbacks) row dicts per order, oldest first."""
+    order_id, payment_id, feedback_id = first_ids
+    user_weights = cum_zipf(len(users), args.user_skew)
+    food_weights = cum_zipf(len(foods), args.zipf)
+    today = days[-1][0]
+
+    for day, count in days:
+        valid_promos = [code for code, valid_from, valid_to in promos if valid_from <= day <= valid_to]
+        # Drawn a day at a time: far fewer calls than one per order
+        buyers = rng.choices(users, cum_weights=user_weights, k=count)
+        sizes = rng.choices(ITEMS_PER_ORDER, ITEMS_WEIGHTS, k=count)
+        picks = rng.choices(foods, cum_weights=food_weights, k=sum(sizes))
+        quantities = rng.choices(QUANTITIES, QUANTITY_WEIGHTS, k=len(picks))
+        position = 0
+
+        for buyer, size in zip(buyers, sizes):
+            lines = {}
+            total = 0
+            for (food_id, price), quantity in zip(picks[position:position + size], quantities[position:position + size]):
+                lines[food_id] = lines.get(food_id, 0) + quantity
+                total += price * quantity
+            position += size
+
+            if day < today:
+                status = order_status.CANCELLED if rng.random() < args.cancel_ratio else order_status.DELIVERED
+            else:
+                status = rng.choices(TODAY_STATUSES, TODAY_WEIGHTS)[0]
+
+            payment = {
+                "payment_id": payment_id,
+                "payment_method": rng.choices(PAYMENT_METHODS, PAYMENT_WEIGHTS)[0],
+                "payment_status": "refunded" if status == order_status.CANCELLED else "paid",
+                "transaction_id": f"TX{payment_id:012d}",
+            }
+            order = {
+                "order_id": order_id,
+                "user_id": buyer,
+                "promo_code": rng.choice(valid_promos) if valid_promos and rng.random() < args.promo_ratio else None,
+                "total_food_price": total,
+                "delivery_fee": cart.DELIVERY_FEE,
+                "status": status,
+                "order_date": day,
+                "payment_id": payment_id,
+            }
+            details = [{"order_id": order_id, "food_id": food_id, "quantity": quantity} for food_id, quantity in lines.items()]
+            feedbacks = []
+            if status == order_status.DELIVERED and rng.random() < args.feedback_ratio:
+                feedbacks.append({
+                    "feedback_id": feedback_id,
+                    "stars": rng.choices(STARS, STARS_WEIGHTS)[0],
+                    "user_id": buyer,
+                    "food_id": rng.choice(list(lines)),
+                    "comment": rng.choice(COMMENTS),
+                })
+                feedback_id += 1
+
+            yield payment, order, details, feedbacks
+            order_id += 1
+            payment_id += 1
+
+
+def load_orders(conn, orders, total, chunk_size):
+    """Insert the generated orders a chunk per transaction, printing progress; returns row counts."""
+    counts = {"orders": 0, "order_details": 0, "payments": 0, "feedbacks": 0}
+    start = time.perf_counter()
+    while chunk := list(itertools.islice(orders, chunk_size)):
+        payments = [payment for payment, _, _, _ in chunk]
+        order_rows = [order for _, order, _, _ in chunk]
+        details = [line for _, _, lines, _ in chunk for line in lines]
+        feedbacks = [feedback for _, _, _, rows in chunk for feedback in rows]
+        # Payments first: orders reference them
+        conn.execute(insert(models.Payment.__table__), payments)
+        conn.execute(insert(models.Orders.__table__), order_rows)
+        conn.execute(insert(models.OrderDetails.__table__), details)
+        if feedbacks:
+            conn.execute(insert(models.Feedback.__table__), feedbacks)
+        conn.commit()
+        counts["orders"] += len(order_rows)
+        counts["order_details"] += len(details)
+        counts["payments"] += len(payments)
+        counts["feedbacks"] += len(feedbacks)
+        elapsed = time.perf_counter() - start
+        print(f"orders {counts['orders']:,}/{total:,} ({counts['orders'] / elapsed:,.0f}/s)", flush=True)
+    return counts
+
+
+def generate(engine, args):
+    migrate_schema(engine)
+    rng = random.Random(args.seed)
+    days = orders_per_day(args.orders, args.days, args.growth, date.today())
+
+    with engine.connect() as conn:
+        if conn.scalar(select(func.count()).select_from(models.Orders)) and not args.append:
+            raise SystemExit("The database already has orders; pass --append to add to them")
+        mysql = conn.dialect.name == "mysql"
+        if mysql:
+            # The generated rows are consistent already; checking each one slows the load
+            conn.execute(text("SET foreign_key_checks = 0, unique_checks = 0"))
+        conn.commit()
+        try:
+            foods = create_menu(conn, rng, args)
+            users = create_users(conn, rng, args)
+            promos = create_promo_codes(conn, rng, args, days)
+            first_ids = (
+                next_id(conn, models.Orders.order_id),
+                next_id(conn, models.Payment.payment_id),
+                next_id(conn, models.Feedback.feedback_id),
+            )
+            conn.commit()
+            orders = generate_orders(rng, args, days, users, foods, promos, first_ids)
+            counts = load_orders(conn, orders, args.orders, args.chunk_size)
+        finally:
+            if mysql:
+                # The connection goes back to the pool
+                conn.rollback()
+                conn.execute(text("SET foreign_key_checks = 1, unique_checks = 1"))
+                conn.commit()
+
+    counts["daily_item_sales"] = rollup.backfill(engine)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10000, help="0 reuses the existing users")
+    parser.add_argument("--foods", type=int, default=200, help="0 reuses the existing menu")
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--promo-codes", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365, help="orders are spread over this many days up to today")
+    parser.add_argument("--growth", type=float, default=1.0, help="how much busier the last day is than the first")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew of the dishes")
+    parser.add_argument("--user-skew", type=float, default=0.8, help="how much more often regulars order")
+    parser.add_argument("--cancel-ratio", type=float, default=0.04)
+    parser.add_argument("--promo-ratio", type=float, default=0.1, help="share of orders using a promo code when one is valid")
+    parser.add_argument("--feedback-ratio", type=float, default=0.05, help="share of delivered orders with feedback")
+    parser.add_argument("--password", default="password", help="password of every generated user")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="orders per transaction")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--append", action="store_true", help="allow adding to a database that has orders")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(engine, args)
+    print(", ".join(f"{count:,} {table}" for table, count in counts.items()) + f" in {time.perf_counter() - start:.1f}s.")
@@ -0,0 +1,464 @@
+"""
+Load test of the storefront and admin API through a real uvicorn server.
+
+    cd OrderingBackEnd
+    python -m benchmarks.loadtest --users 50 --admins 2 --duration 60 --output run.json
+    python -m benchmarks.loadtest --baseline run.json    # same run, compared with an earlier one
+
+Runs against DATABASE_URL / ASYNC_DATABASE_URL (DB_MODE picks the engine)
+like the app. A SQLite file can stand in for MySQL:
+
+    DATABASE_URL=sqlite:///loadtest.db ASYNC_DATABASE_URL=sqlite+aiosqlite:///loadtest.db \\
+        python -m benchmarks.loadtest
+
+SQLite serializes writes, so its numbers only compare runs with each other.
+
+The schema is migrated, a throwaway menu, promo code and admin are created,
+and uvicorn is started with the same environment (or --url points at a
+server already running on the same database). Every virtual customer
+registers, then repeats a session until the time is up: log in, load the
+menu, add and remove cart items, view the cart, validate a promo code,
+complete the order and read the order history, with think time between
+requests. Dishes are picked with Zipf-like popularity. Admins list the
+completed and preparing orders and move the load test's ones on, read the
+best sellers and poll the order change feed.
+
+Requests during --warmup are not counted. The report gives p50/p95/p99
+latency, requests per second and error rate per endpoint; a failed request
+or a status of 400 and above is an error. Fixture rows are removed
+afterwards unless --keep.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import secrets
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy import delete, select
+
+import database
+import models
+from benchmarks._common import dispose_engines, migrate_schema, summarize
+
+LOAD_CATEGORY = "__load__"
+LOAD_ADMIN = "__load_admin__"
+LOAD_PROMO = "__LOAD__"
+USER_PREFIX = "__load_user_"
+ADMIN_PASSWORD = "load-admin-password"
+USER_PASSWORD = "load-password"
+
+
+async def create_fixtures(menu_size):
+    """Create a throwaway menu, promo code and admin; return the food ids, most popular first."""
+    await drop_fixtures()
+    db = database.open_async_session()
+    try:
+        db.add(models.Category(category_name=LOAD_CATEGORY))
+        db.add(models.PromoCode(
+            code=LOAD_PROMO, discount=10,
+            valid_from=date.today() - timedelta(days=1), valid_to=date.today() + timedelta(days=30),
+        ))
+        db.add(models.Admin(username=LOAD_ADMIN, password=ADMIN_PASSWORD))
+        foods = [
+            models.FoodItem(
+                name=f"__load_food_{i}__", price=500 + 50 * (i % 20), description="load test",
+                category_name=LOAD_CATEGORY, price_to_make=200, photo="",
+            )
+            for i in range(menu_size)
+        ]
+        for food in foods:
+            db.add(food)
+        await db.commit()
+        return [food.food_id for food in foods]
+    finally:
+        await db.close()
+
+
+async def drop_fixtures():
+    db = database.open_async_session()
+    try:
+        user_ids = select(models.User.user_id).where(models.User.username.startswith(USER_PREFIX, autoescape=True))
+        order_ids = select(models.Orders.order_id).where(models.Orders.user_id.in_(user_ids))
+        food_ids = select(models.FoodItem.food_id).where(models.FoodItem.category_name == LOAD_CATEGORY)
+        await db.execute(delete(models.OrderDetails).where(models.OrderDetails.order_id.in_(order_ids)))
+        await db.execute(delete(models.Orders).where(models.Orders.user_id.in_(user_ids)))
+        await db.execute(delete(models.User).where(models.User.username.startswith(USER_PREFIX, autoescape=True)))
+        await db.execute(delete(models.DailyItemSales).where(models.DailyItemSales.food_id.in_(food_ids)))
+        await db.execute(delete(models.FoodItem).where(models.FoodItem.category_name == LOAD_CATEGORY))
+        await db.execute(delete(models.Category).where(models.Category.category_name == LOAD_CATEGORY))
+        await db.execute(delete(models.PromoCode).where(models.PromoCode.code == LOAD_PROMO))
+        await db.execute(delete(models.Admin).where(models.Admin.username == LOAD_ADMIN))
+        await db.commit()
+    finally:
+        await db.close()
+
+
+class Recorder:
+    """Latency and outcome (status code or exception name) of each request, per endpoint."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+        self.recording = False
+        self.started = self.stopped = 0.0
+
+    def start(self):
+        self.recording = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.recording = False
+        self.stopped = time.perf_counter()
+
+    def add(self, endpoint, elapsed_ms, outcome):
+        if self.recording:
+            self.latencies[endpoint].append(elapsed_ms)
+            self.outcomes[endpoint][outcome] += 1
+
+    def report(self):
+        seconds = self.stopped - self.started
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            outcomes = self.outcomes[endpoint]
+            errors = sum(count for outcome, count in outcomes.items() if not is_success(outcome))
+            summary = summarize(self.latencies[endpoint])
+            summary.update({
+                "requests_per_second": round(summary["n"] / seconds, 2),
+                "errors": errors,
+                "error_rate": round(errors / summary["n"], 4),
+                "outcomes": dict(sorted(outcomes.items())),
+            })
+            endpoints[endpoint] = summary
+        requests = sum(summary["n"] for summary in endpoints.values())
+        errors = sum(summary["errors"] for summary in endpoints.values())
+        totals = {
+            "seconds": round(seconds, 3),
+            "requests": requests,
+            "requests_per_second": round(requests / seconds, 2),
+            "errors": errors,
+            "error_rate": round(errors / requests, 4) if requests else 0.0,
+        }
+        return totals, endpoints
+
+
+def is_success(outcome):
+    return outcome.isdigit() and int(outcome) < 400
+
+
+class Client:
+    """Sends requests through one shared httpx client and records each under its endpoint name."""
+
+    def __init__(self, http, recorder):
+        self.http = http
+        self.recorder = recorder
+
+    async def call(self, endpoint, url, token=None, headers=None, **kwargs):
+        # The endpoint name starts with the method, e.g. "POST /cart/add"
+        method = endpoint.split(" ", 1)[0]
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError as exc:
+            self.recorder.add(endpoint, (time.perf_counter() - start) * 1000, type(exc).__name__)
+            return None
+        self.recorder.add(endpoint, (time.perf_counter() - start) * 1000, str(response.status_code))
+        return response if response.status_code < 400 else None
+
+
+def token_user(token):
+    """The uid a session token was issued to (read without verifying it)."""
+    payload = token.split(".")[1]
+    return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["uid"]
+
+
+async def think(rng, mean_ms):
+    if mean_ms > 0:
+        await asyncio.sleep(rng.expovariate(1000 / mean_ms))
+
+
+async def customer(client, index, food_ids, weights, load_users, args):
+    rng = random.Random(f"{args.seed}-customer-{index}")
+    # Arrivals spread over the warm-up rather than all registering at once
+    await asyncio.sleep(rng.uniform(0, args.warmup))
+
+    username = f"{USER_PREFIX}{args.run_id}_{index}__"
+    credentials = {"username": username, "password": USER_PASSWORD}
+    response = await client.call("POST /api/user/register", "/api/user/register", json={
+        **credentials, "phone_number": "00000000", "address": "load test",
+    })
+    if response is None or not response.json()["success"]:
+        return
+    load_users.add(token_user(response.json()["token"]))
+
+    menu_etag = None  # Kept across sessions like a browser cache
+    while True:
+        await think(rng, args.think_ms)
+        response = await client.call("POST /api/user/login", "/api/user/login", json=credentials)
+        if response is None or not response.json()["success"]:
+            continue
+        token = response.json()["token"]
+
+        await think(rng, args.think_ms)
+        response = await client.call(
+            "GET /api/food/list", "/api/food/list", headers={"If-None-Match": menu_etag} if menu_etag else None,
+        )
+        if response is not None:
+            menu_etag = response.headers.get("etag", menu_etag)
+
+        cart = Counter()
+        for _ in range(rng.randint(1, 2 * args.cart_adds - 1)):
+            await think(rng, args.think_ms)
+            food_id = rng.choices(food_ids, weights)[0]
+            if await client.call("POST /cart/add", "/cart/add", token, json={"food_id": food_id, "quantity": 1}):
+                cart[food_id] += 1
+            if cart and rng.random() < args.remove_ratio:
+                await think(rng, args.think_ms)
+                food_id = rng.choice(list(cart))
+                if await client.call("DELETE /cart/remove", "/cart/remove", token, json={"food_id": food_id}):
+                    cart[food_id] -= 1
+                    if not cart[food_id]:
+                        del cart[food_id]
+
+        await think(rng, args.think_ms)
+        await client.call("GET /cart", "/cart", token)
+        if rng.random() < args.promo_ratio:
+            await think(rng, args.think_ms)
+            await client.call("POST /promocode/validate", "/promocode/validate", json={"code": LOAD_PROMO})
+        if cart:
+            await think(rng, args.think_ms)
+            await client.call("POST /orders/complete", "/orders/complete", token)
+        await think(rng, args.think_ms)
+        await client.call("GET /orders/history", "/orders/history", token, params={"limit": 20})
+
+
+async def admin(client, index, load_users, args):
+    rng = random.Random(f"{args.seed}-admin-{index}")
+    await asyncio.sleep(rng.uniform(0, args.warmup))
+
+    token = None
+    while token is None:
+        response = await client.call("POST /api/admin/login", "/api/admin/login", json={
+            "username": LOAD_ADMIN, "password": ADMIN_PASSWORD,
+        })
+        token = response.json()["token"] if response is not None else None
+        if token is None:
+            await think(rng, args.admin_think_ms)
+
+    position = None
+    while True:
+        # The kitchen moves orders along; only the load test's own orders are touched
+        for current, following in (("completed", "preparing"), ("preparing", "ready")):
+            await think(rng, args.admin_think_ms)
+            response = await client.call("GET /orders/", "/orders/", token, params={"status": current, "limit": 50})
+            if response is None:
+                continue
+            order_ids = [order["order_id"] for order in response.json()["items"] if order["user_id"] in load_users]
+            if order_ids:
+                await client.call("PUT /orders/status:batch", "/orders/status:batch", token, json={
+                    "order_ids": order_ids, "status": following,
+                })
+
+        await think(rng, args.admin_think_ms)
+        await client.call("GET /best-seller/", "/best-seller/", token, params={"window": "7d", "top": 10})
+
+        await think(rng, args.admin_think_ms)
+        response = await client.call(
+            "GET /orders/changes", "/orders/changes", token, params={} if position is None else {"since": position},
+        )
+        if response is not None:
+            position = response.json()["next"]
+
+
+@asynccontextmanager
+async def server(args):
+    """Start uvicorn on the benchmark's database; yields its base URL."""
+    if args.url:
+        yield args.url
+        return
+
+    env = dict(os.environ)
+    # The schema is migrated here already, and every worker must accept every token
+    env["DB_AUTO_MIGRATE"] = "0"
+    env.setdefault("TOKEN_KEYS", f"load:{secrets.token_hex(32)}")
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,  # The app prints on every checkout
+    )
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        async with httpx.AsyncClient(base_url=url) as http:
+            deadline = time.monotonic() + args.startup_timeout
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"uvicorn did not answer on {url} within {args.startup_timeout}s")
+                try:
+                    if (await http.get("/")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+
+
+def compare(baseline, totals, endpoints):
+    """Relative change of throughput and tail latency against an earlier report."""
+    def change(old, new):
+        return round(new / old - 1, 4) if old else None
+
+    compared = {}
+    for endpoint, summary in endpoints.items():
+        old = baseline["endpoints"].get(endpoint)
+        if old is None:
+            continue
+        compared[endpoint] = {
+            "requests_per_second": change(old["requests_per_second"], summary["requests_per_second"]),
+            "p95_ms": change(old["p95_ms"], summary["p95_ms"]),
+            "p99_ms": change(old["p99_ms"], summary["p99_ms"]),
+            "error_rate": round(summary["error_rate"] - old["error_rate"], 4),
+        }
+    return {
+        "commit": baseline["meta"].get("commit"),
+        "label": baseline["meta"].get("label"),
+        "requests_per_second": change(baseline["totals"]["requests_per_second"], totals["requests_per_second"]),
+        "error_rate": round(totals["error_rate"] - baseline["totals"]["error_rate"], 4),
+        "endpoints": compared,
+    }
+
+
+async def main(args):
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    migrate_schema(database.engine)
+    food_ids = await create_fixtures(args.menu_size)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(food_ids))]
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    recorder = Recorder()
+    load_users = set()
+
+    try:
+        async with server(args) as url:
+            limits = httpx.Limits(max_connections=args.users + args.admins, max_keepalive_connections=args.users + args.admins)
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as http:
+                client = Client(http, recorder)
+                sessions = [
+                    asyncio.create_task(customer(client, i, food_ids, weights, load_users, args))
+                    for i in range(args.users)
+                ] + [
+                    asyncio.create_task(admin(client, i, load_users, args))
+                    for i in range(args.admins)
+                ]
+                await asyncio.sleep(args.warmup)
+                recorder.start()
+                await asyncio.sleep(args.duration)
+                recorder.stop()
+
+                for session in sessions:
+                    session.cancel()
+                results = await asyncio.gather(*sessions, return_exceptions=True)
+                failures = [result for result in results if isinstance(result, Exception)]
+                if failures:
+                    raise failures[0]
+    finally:
+        if not args.keep:
+            await drop_fixtures()
+        await dispose_engines()
+
+    totals, endpoints = recorder.report()
+    report = {
+        "meta": {
+            "label": args.label,
+            "commit": git_commit(),
+            "started_at": started_at,
+            "url": args.url or "local uvicorn",
+            "workers": None if args.url else args.workers,
+            "dialect": database.engine.dialect.name,
+            "db_mode": database.DB_MODE,
+            "cart_store": os.getenv("CART_STORE", "db").lower(),
+            "users": args.users,
+            "admins": args.admins,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "think_ms": args.think_ms,
+            "admin_think_ms": args.admin_think_ms,
+            "menu_size": args.menu_size,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "totals": totals,
+        "endpoints": endpoints,
+    }
+    if baseline is not None:
+        report["baseline"] = compare(baseline, totals, endpoints)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent customer sessions")
+    parser.add_argument("--admins", type=int, default=1, help="concurrent admin sessions")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of ramp-up that are not measured")
+    parser.add_argument("--think-ms", type=float, default=200, help="mean customer pause between requests")
+    parser.add_argument("--admin-think-ms", type=float, default=1000, help="mean admin pause between requests")
+    parser.add_argument("--cart-adds", type=int, default=5, help="mean items added per session")
+    parser.add_argument("--remove-ratio", type=float, default=0.2, help="chance of a remove after each add")
+    parser.add_argument("--promo-ratio", type=float, default=0.3, help="share of sessions validating a promo code")
+    parser.add_argument("--menu-size", type=int, default=40, help="dishes on the throwaway menu")
+    parser.add_argument("--zipf", type=float, default=1.0, help="popularity skew of the dishes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="use a server already running on the same database instead of starting one")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument("--label", help="free-form name stored in the report")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--keep", action="store_true", help="leave the fixture rows in the database")
+    args = parser.parse_args()
+    args.run_id = secrets.token_hex(3)
+    asyncio.run(main(args))
@@ -0,0 +1,112 @@
+import asyncio
+import heapq
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import select
+
+import models
+
+# Longest window served; a window of N days covers today and the N days before it
+MAX_WINDOW_DAYS = 30
+
+# Other workers' completions only show up here after a reseed
+SALES_WINDOW_TTL_SECONDS = float(os.getenv("SALES_WINDOW_TTL_SECONDS", "300"))
+
+
+class SalesWindow:
+    """
+    Per-day, per-item quantities for the last MAX_WINDOW_DAYS days, held in a
+    ring of day slots so best-seller lookups need no query.
+
+    Seeded from daily_item_sales and bumped with the same rows the rollup
+    receives. Slots belonging to a past day are reset the first time the
+    ring is touched after midnight.
+    """
+
+    def __init__(self, days=MAX_WINDOW_DAYS, ttl=SALES_WINDOW_TTL_SECONDS):
+        self.days = days
+        self.ttl = ttl
+        # slot index -> (day, Counter of food_id -> quantity)
+        self._slots = [None] * (days + 1)
+        # days -> (version, today, Counter) so repeated lookups skip the summing
+        self._totals = {}
+        self._lock = asyncio.Lock()
+        self._mutex = threading.Lock()
+        self.version = 0
+        self.loaded_at = 0.0
+
+    def is_fresh(self):
+        return time.monotonic() - self.loaded_at < self.ttl
+
+    def _slot(self, day):
+        # Called with _mutex held
+        index = day.toordinal() % len(self._slots)
+        slot = self._slots[index]
+        if slot is None or slot[0] != day:
+            slot = (day, Counter())
+            self._slots[index] = slot
+        return slot[1]
+
+    def _in_window(self, day, today):
+        return day is not None and today - timedelta(days=self.days) <= day <= today
+
+    async def seed(self, db):
+        """Reload the window from the daily sales rollup."""
+        async with self._lock:
+            if self.is_fresh():
+                return
+            version = self.version
+            today = date.today()
+            Sales = models.DailyItemSales
+            rows = (await db.execute(
+                select(Sales.date, Sales.food_id, Sales.qty)
+                .where(Sales.date >= today - timedelta(days=self.days), Sales.date <= today)
+            )).all()
+
+            with self._mutex:
+                self._slots = [None] * (self.days + 1)
+                for day, food_id, qty in rows:
+                    self._slot(day)[food_id] += qty
+                self._totals = {}
+                # A completion that raced with the query may be missing: reseed next time
+                self.loaded_at = time.monotonic() if version == self.version else 0.0
+                self.version += 1
+
+    def record(self, rows):
+        """Apply (day, food_id, qty, ...) rows as sent to the rollup, after commit."""
+        today = date.today()
+        with self._mutex:
+            for day, food_id, qty, *_ in rows:
+                if self._in_window(day, today):
+                    self._slot(day)[food_id] += qty
+            self._totals = {}
+            self.version += 1
+
+    def totals(self, days):
+        """Counter of food_id -> quantity sold from `days` days ago through today."""
+        today = date.today()
+        cached = self._totals.get(days)
+        if cached is not None and cached[0] == self.version and cached[1] == today:
+            return cached[2]
+
+        with self._mutex:
+            version = self.version
+            totals = Counter()
+            for offset in range(days + 1):
+                slot = self._slots[(today - timedelta(days=offset)).toordinal() % len(self._slots)]
+                if slot is not None and slot[0] == today - timedelta(days=offset):
+                    totals.update(slot[1])
+            self._totals[days] = (version, today, totals)
+        return totals
+
+    def top(self, days, n=1):
+        """The `n` best-selling (food_id, quantity) pairs over the window."""
+        sold = ((food_id, qty) for food_id, qty in self.totals(days).items() if qty > 0)
+        return heapq.nlargest(n, sold, key=lambda pair: pair[1])
+
+
+sales = SalesWindow()
@@ -0,0 +1,167 @@
+from datetime import date
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, insert, literal, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+import catalog
+import models
+
+DELIVERY_FEE = 5000  # Example delivery fee
+
+
+def upsert_order_detail(dialect_name, order_id, food_id, quantity):
+    """INSERT the line item, or add to its quantity if (order_id, food_id) already exists."""
+    table = models.OrderDetails.__table__
+    if dialect_name == "mysql":
+        stmt = mysql_insert(table).values(order_id=order_id, food_id=food_id, quantity=quantity)
+        return stmt.on_duplicate_key_update(quantity=table.c.quantity + stmt.inserted.quantity)
+    # SQLite stand-in used for local runs
+    stmt = sqlite_insert(table).values(order_id=order_id, food_id=food_id, quantity=quantity)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.order_id, table.c.food_id],
+        set_={"quantity": table.c.quantity + stmt.excluded.quantity},
+    )
+
+
+async def add_item(db, user_id, food_id, quantity, price=None):
+    """
+    Add `quantity` of a food item to the user's pending order in a single
+    transaction and return the order id. `price` comes from the menu catalog
+    when known; otherwise it is read from food_items inside the UPDATE.
+
+    Statements: lock user + find pending order, [insert order], bump the
+    order total in SQL, upsert the line item, commit.
+    """
+    try:
+        # Lock the user row (and its pending order, if any) so concurrent adds
+        # for the same user queue up instead of creating two pending orders
+        row = (await db.execute(
+            select(models.User.user_id, models.Orders.order_id)
+            .outerjoin(models.Orders, and_(
+                models.Orders.user_id == models.User.user_id,
+                models.Orders.status == "pending",
+            ))
+            .where(models.User.user_id == user_id)
+            .limit(1)
+            .with_for_update()
+        )).first()
+        if row is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+        order_id = row.order_id
+
+        # If no active order exists, create one
+        if order_id is None:
+            result = await db.execute(insert(models.Orders.__table__).values(
+                user_id=user_id,
+                status="pending",
+                order_date=date.today(),
+                total_food_price=0,
+                delivery_fee=DELIVERY_FEE,
+            ))
+            order_id = result.inserted_primary_key[0]
+
+        # Increment the total in SQL; with the subquery no row matches when
+        # the food item doesn't exist. Core tables are used so the ORM doesn't
+        # add synchronisation SELECTs.
+        if price is None:
+            price = select(models.FoodItem.price).where(models.FoodItem.food_id == food_id).scalar_subquery()
+        else:
+            price = literal(price)
+        result = await db.execute(
+            update(models.Orders.__table__)
+            .where(models.Orders.order_id == order_id, price.is_not(None))
+            .values(total_food_price=models.Orders.total_food_price + price * quantity)
+        )
+        if result.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Food item not found")
+
+        try:
+            await db.execute(upsert_order_detail(db.bind.dialect.name, order_id, food_id, quantity))
+        except IntegrityError:
+            # The catalog still had an item another worker has since deleted
+            raise HTTPException(status_code=404, detail="Food item not found")
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+
+    return order_id
+
+
+async def read_cart(db, user_id):
+    """
+    Return the user's pending order with its line items from a single joined
+    query, or None when the cart is empty. Names and prices come from the
+    menu catalog, which only queries food_items for items it doesn't hold.
+    """
+    rows = (await db.execute(
+        select(
+            models.Orders.order_id,
+            models.Orders.total_food_price,
+            models.Orders.delivery_fee,
+            models.OrderDetails.food_id,
+            models.OrderDetails.quantity,
+        )
+        .select_from(models.Orders)
+        .outerjoin(models.OrderDetails, models.OrderDetails.order_id == models.Orders.order_id)
+        .where(models.Orders.user_id == user_id, models.Orders.status == "pending")
+        .order_by(models.Orders.order_id)
+    )).all()
+
+    if not rows:
+        return None
+
+    order = rows[0]
+    # An order without lines comes back as a single row of NULLs
+    lines = [row for row in rows if row.order_id == order.order_id and row.food_id is not None]
+    food_items = await catalog.menu.get_many(db, [row.food_id for row in lines])
+
+    cart_items = []
+    for row in lines:
+        food_item = food_items.get(row.food_id)
+        if food_item is None:
+            continue  # Removed from the menu while sitting in the cart
+        cart_items.append({
+            "food_id": row.food_id,
+            "name": food_item["name"],
+            "quantity": row.quantity,
+            "price_per_item": food_item["price"],
+            "total_price": food_item["price"] * row.quantity,
+        })
+
+    return {
+        "order_id": order.order_id,
+        "items": cart_items,
+        "total_food_price": order.total_food_price,
+        "delivery_fee": order.delivery_fee,
+        "grand_total": order.total_food_price + order.delivery_fee,
+    }
+
+
+async def read_order_lines(db, order_ids):
+    """Line items of several orders from one batched query, keyed by order_id."""
+    lines = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return lines
+
+    rows = (await db.execute(
+        select(models.OrderDetails.order_id, models.OrderDetails.food_id, models.OrderDetails.quantity)
+        .where(models.OrderDetails.order_id.in_(order_ids))
+        .order_by(models.OrderDetails.order_id, models.OrderDetails.food_id)
+    )).all()
+    food_items = await catalog.menu.get_many(db, {row.food_id for row in rows})
+
+    for row in rows:
+        food_item = food_items.get(row.food_id)
+        lines[row.order_id].append({
+            "food_id": row.food_id,
+            # Past orders may reference dishes since removed from the menu
+            "name": food_item["name"] if food_item else None,
+            "quantity": row.quantity,
+            "price_per_item": food_item["price"] if food_item else None,
+        })
+    return lines
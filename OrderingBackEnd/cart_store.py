@@ -0,0 +1,257 @@
+"""
+Where pending carts live.
+
+CART_STORE=db (the default) keeps the original behaviour: every cart click
+writes the pending order and its order_details rows. With "memory" or
+"redis" a cart is only {food_id: quantity} in a cart store, and the
+database first sees it at checkout, when checkout() writes the completed
+order, its lines and the sales rollup in one transaction.
+
+- memory: a dict in this process. Workers don't share it, so it suits a
+  single worker, local runs and tests.
+- redis: one hash per user in Redis (REDIS_URL), shared by all workers;
+  needs the redis package.
+
+A stored cart expires CART_TTL_SECONDS after its last change. Its prices
+are read from the menu when it is shown and at checkout, rather than
+fixed when each item was added.
+"""
+import os
+import time
+from datetime import date
+
+from fastapi import HTTPException, status
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+import cart
+import catalog
+import models
+import order_status
+import rollup
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; only CART_STORE=redis needs it
+    aioredis = None
+
+CART_STORE = os.getenv("CART_STORE", "db").lower()
+CART_TTL_SECONDS = int(os.getenv("CART_TTL_SECONDS", str(24 * 3600)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Expired carts are dropped on access, and swept at most this often
+SWEEP_INTERVAL_SECONDS = 60
+
+
+class MemoryCartStore:
+    """Carts in a dict of user_id -> (expires_at, {food_id: quantity}), used from the event loop only."""
+
+    def __init__(self, ttl=CART_TTL_SECONDS):
+        self.ttl = ttl
+        self._carts = {}
+        self._next_sweep = 0.0
+
+    def _live(self, user_id):
+        entry = self._carts.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._carts[user_id]
+            return None
+        return entry[1]
+
+    def _touch(self, user_id, items):
+        now = time.monotonic()
+        self._carts[user_id] = (now + self.ttl, items)
+        if now >= self._next_sweep:
+            # Abandoned carts would otherwise stay until their user comes back
+            self._carts = {key: entry for key, entry in self._carts.items() if entry[0] > now}
+            self._next_sweep = now + min(self.ttl, SWEEP_INTERVAL_SECONDS)
+
+    async def add(self, user_id, food_id, quantity):
+        items = self._live(user_id) or {}
+        items[food_id] = items.get(food_id, 0) + quantity
+        self._touch(user_id, items)
+        return items[food_id]
+
+    async def remove_one(self, user_id, food_id):
+        """Take one off the item's quantity; returns what is left, or None if it wasn't in the cart."""
+        items = self._live(user_id)
+        if not items or food_id not in items:
+            return None
+        left = items[food_id] - 1
+        if left > 0:
+            items[food_id] = left
+        else:
+            del items[food_id]
+        if items:
+            self._touch(user_id, items)
+        else:
+            del self._carts[user_id]
+        return left
+
+    async def items(self, user_id):
+        return dict(self._live(user_id) or {})
+
+    async def take(self, user_id):
+        """Remove and return the whole cart, so only one checkout gets it."""
+        items = self._live(user_id)
+        self._carts.pop(user_id, None)
+        return items or {}
+
+    async def restore(self, user_id, items):
+        """Put back a cart whose checkout failed, merged with anything added since."""
+        for food_id, quantity in items.items():
+            await self.add(user_id, food_id, quantity)
+
+    def stats(self):
+        return {"backend": "memory", "carts": len(self._carts), "ttl_seconds": self.ttl}
+
+
+# Decrement one field; drop it at zero. -1 when the item wasn't in the cart.
+REMOVE_ONE = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then return -1 end
+local left = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+if left <= 0 then redis.call('HDEL', KEYS[1], ARGV[1]) end
+if redis.call('EXISTS', KEYS[1]) == 1 then redis.call('EXPIRE', KEYS[1], ARGV[2]) end
+return left
+"""
+
+
+class RedisCartStore:
+    """Carts as Redis hashes cart:<user_id> of food_id -> quantity, expiring with the key."""
+
+    def __init__(self, client, ttl=CART_TTL_SECONDS, prefix="cart:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self._remove_one = client.register_script(REMOVE_ONE)
+
+    def _key(self, user_id):
+        return f"{self.prefix}{user_id}"
+
+    async def add(self, user_id, food_id, quantity):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self._key(user_id), food_id, quantity)
+            pipe.expire(self._key(user_id), self.ttl)
+            total, _ = await pipe.execute()
+        return total
+
+    async def remove_one(self, user_id, food_id):
+        left = await self._remove_one(keys=[self._key(user_id)], args=[food_id, self.ttl])
+        return None if left < 0 else left
+
+    async def items(self, user_id):
+        stored = await self.client.hgetall(self._key(user_id))
+        return {int(food_id): int(quantity) for food_id, quantity in stored.items()}
+
+    async def take(self, user_id):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self._key(user_id))
+            pipe.delete(self._key(user_id))
+            stored, _ = await pipe.execute()
+        return {int(food_id): int(quantity) for food_id, quantity in stored.items()}
+
+    async def restore(self, user_id, items):
+        async with self.client.pipeline(transaction=True) as pipe:
+            for food_id, quantity in items.items():
+                pipe.hincrby(self._key(user_id), food_id, quantity)
+            pipe.expire(self._key(user_id), self.ttl)
+            await pipe.execute()
+
+    def stats(self):
+        return {"backend": "redis", "ttl_seconds": self.ttl}
+
+
+def open_store(kind=CART_STORE):
+    """The configured cart store, or None when carts stay in the database."""
+    if kind == "db":
+        return None
+    if kind == "memory":
+        return MemoryCartStore()
+    if kind == "redis":
+        if aioredis is None:
+            raise RuntimeError("CART_STORE=redis needs the redis package")
+        return RedisCartStore(aioredis.from_url(REDIS_URL))
+    raise ValueError(f"CART_STORE must be 'db', 'memory' or 'redis', got '{kind}'")
+
+
+store = open_store()
+
+
+async def read_cart(db, carts, user_id):
+    """The stored cart in the shape of cart.read_cart(), priced from the menu catalog; None when empty."""
+    items = await carts.items(user_id)
+    if not items:
+        return None
+    food_items = await catalog.menu.get_many(db, list(items))
+
+    cart_items = []
+    for food_id, quantity in items.items():
+        food_item = food_items.get(food_id)
+        if food_item is None:
+            continue  # Removed from the menu while sitting in the cart
+        cart_items.append({
+            "food_id": food_id,
+            "name": food_item["name"],
+            "quantity": quantity,
+            "price_per_item": food_item["price"],
+            "total_price": food_item["price"] * quantity,
+        })
+    total_food_price = sum(item["total_price"] for item in cart_items)
+
+    return {
+        "order_id": None,  # Assigned at checkout
+        "items": cart_items,
+        "total_food_price": total_food_price,
+        "delivery_fee": cart.DELIVERY_FEE,
+        "grand_total": total_food_price + cart.DELIVERY_FEE,
+    }
+
+
+async def checkout(db, carts, user_id):
+    """
+    Write the user's stored cart as a completed order: the order row, its
+    lines and the rollup in one transaction. Returns (the order row as a
+    dict, sold rows for best_sellers). On failure the cart is put back.
+    """
+    items = await carts.take(user_id)
+    if not items:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No active order found.")
+    try:
+        food_items = await catalog.menu.get_many(db, list(items))
+    except BaseException:
+        await carts.restore(user_id, items)
+        raise
+
+    # Dishes taken off the menu meanwhile are dropped
+    lines = {food_id: quantity for food_id, quantity in items.items() if food_id in food_items}
+    if not lines:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No active order found.")
+
+    try:
+        order = {
+            "user_id": user_id,
+            "promo_code": None,
+            "total_food_price": sum(food_items[food_id]["price"] * quantity for food_id, quantity in lines.items()),
+            "delivery_fee": cart.DELIVERY_FEE,
+            "status": order_status.COMPLETED,
+            "order_date": date.today(),
+            "payment_id": None,
+        }
+        result = await db.execute(insert(models.Orders.__table__).values(order))
+        order_id = result.inserted_primary_key[0]
+        await db.execute(insert(models.OrderDetails.__table__), [
+            {"order_id": order_id, "food_id": food_id, "quantity": quantity} for food_id, quantity in lines.items()
+        ])
+        sold = (await db.execute(rollup.sales_select([models.OrderDetails.order_id == order_id]))).all()
+        await db.execute(rollup.record_orders(db.bind.dialect.name, [order_id]))
+        await db.commit()
+    except BaseException as exc:
+        await db.rollback()
+        await carts.restore(user_id, items)
+        if isinstance(exc, IntegrityError):
+            # No such user, or a dish deleted since the catalog last loaded
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User or food item not found")
+        raise
+    return {"order_id": order_id, **order}, sold
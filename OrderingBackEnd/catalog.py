@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+import http_cache
+import models
+
+CATALOG_MAX_ITEMS = int(os.getenv("CATALOG_MAX_ITEMS", "5000"))
+
+# Other workers don't see our invalidations, so reload periodically anyway
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+
+
+def to_row(item):
+    """Plain dict in the shape of FoodItemResponse."""
+    return {
+        "food_id": item.food_id,
+        "name": item.name,
+        "price": item.price,
+        "description": item.description,
+        "category_name": item.category_name or "Unknown",  # Default to "Unknown" if None
+        "price_to_make": item.price_to_make,
+        "photo": item.photo,
+        "photo_variants": json.loads(item.photo_variants) if item.photo_variants else None,
+    }
+
+
+class MenuCatalog:
+    """
+    In-process copy of the menu, keyed by food_id and by category.
+
+    When the whole menu fits in `max_items` the catalog is "complete" and can
+    answer list queries on its own; otherwise it degrades to a bounded LRU of
+    individual items and list queries go to the database.
+    """
+
+    def __init__(self, max_items=CATALOG_MAX_ITEMS, ttl=CATALOG_TTL_SECONDS):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._by_category = {}
+        # category (None for the full menu) -> (version, RenderedPayload)
+        self._rendered = {}
+        self._lock = asyncio.Lock()
+        # Guards _items against invalidate() calls from threadpool endpoints
+        self._mutex = threading.Lock()
+        self.complete = False
+        self.loaded_at = 0.0
+        self.version = 0
+        # Newest food_items change_log seq seen by observe()
+        self.seen_seq = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def is_fresh(self):
+        return self.complete and time.monotonic() - self.loaded_at < self.ttl
+
+    def invalidate(self, food_id=None):
+        # Called from sync endpoints running in the threadpool, so swap in a
+        # new dict rather than mutating the one readers may be iterating
+        with self._mutex:
+            if food_id is not None and food_id in self._items:
+                items = OrderedDict(self._items)
+                del items[food_id]
+                self._items = items
+            self.complete = False
+            self.version += 1
+
+    def observe(self, seq):
+        """
+        Drop every cached row when the menu changed after the last call
+        (`seq` is the newest food_items change_log entry), including changes
+        made by other workers, whose invalidations we never see.
+        """
+        if seq == self.seen_seq:
+            return
+        with self._mutex:
+            self._items = OrderedDict()
+            self._by_category = {}
+            self._rendered = {}
+            self.complete = False
+            self.version += 1
+            self.seen_seq = seq
+
+    async def sync(self, db):
+        """observe() the newest food_items change, for readers that don't get it from http_cache.user_tag."""
+        seq = await db.scalar(select(http_cache.newest_seq(models.ChangeLog.entity == "food_item")))
+        if seq is not None:
+            self.observe(seq)
+
+    async def load(self, db):
+        """Reload the whole menu (at most max_items + 1 rows)."""
+        async with self._lock:
+            if self.is_fresh():
+                return
+            version = self.version
+            items = (await db.scalars(
+                select(models.FoodItem).order_by(models.FoodItem.food_id).limit(self.max_items + 1)
+            )).all()
+            rows = [to_row(item) for item in items[:self.max_items]]
+
+            by_category = {}
+            for row in rows:
+                by_category.setdefault(row["category_name"], []).append(row["food_id"])
+
+            with self._mutex:
+                if version != self.version:
+                    return  # Invalidated meanwhile: the rows may be stale, reload next time
+                self._items = OrderedDict((row["food_id"], row) for row in rows)
+                self._by_category = by_category
+                self._rendered = {}
+                self.complete = len(items) <= self.max_items
+                self.loaded_at = time.monotonic()
+                self.version += 1
+                self.loads += 1
+
+    async def list_items(self, db, category=None):
+        """All menu rows (optionally one category), or None if the menu doesn't fit."""
+        if not self.is_fresh():
+            await self.load(db)
+        if not self.complete:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if category is None:
+            return list(self._items.values())
+        return [self._items[food_id] for food_id in self._by_category.get(category, [])]
+
+    async def payload(self, db, category=None):
+        """
+        The /api/food/list body rendered once per catalog version, or None if
+        the menu doesn't fit in the catalog. A fresh catalog answers without
+        any database or serialization work.
+        """
+        cached = self._rendered.get(category)
+        if cached is not None and cached[0] == self.version and self.is_fresh():
+            self.hits += 1
+            return cached[1]
+
+        rows = await self.list_items(db, category)
+        if rows is None:
+            return None
+        # Taken before rendering: a concurrent invalidation makes this stale
+        version = self.version
+        payload = http_cache.RenderedPayload.from_content({"success": True, "data": rows})
+        if category is None or category in self._by_category:
+            self._rendered[category] = (version, payload)
+        return payload
+
+    def _remember(self, row):
+        with self._mutex:
+            self._items[row["food_id"]] = row
+            self._items.move_to_end(row["food_id"])
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    async def get_many(self, db, food_ids):
+        """Map food_id -> row, fetching anything not cached in one query."""
+        found = {}
+        missing = []
+        for food_id in food_ids:
+            row = self._items.get(food_id)
+            if row is None:
+                missing.append(food_id)
+            else:
+                found[food_id] = row
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if missing:
+            items = (await db.scalars(
+                select(models.FoodItem).where(models.FoodItem.food_id.in_(missing))
+            )).all()
+            for item in items:
+                row = to_row(item)
+                found[item.food_id] = row
+                self._remember(row)
+            if items and self.complete:
+                # Someone else added to the menu: the next list reloads it
+                self.invalidate()
+        return found
+
+    async def get(self, db, food_id):
+        return (await self.get_many(db, [food_id])).get(food_id)
+
+    def peek(self, food_id):
+        """Cached row or None, without touching the database."""
+        row = self._items.get(food_id)
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._items),
+            "categories": len(self._by_category),
+            "max_items": self.max_items,
+            "complete": self.complete,
+            "version": self.version,
+            "loads": self.loads,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+menu = MenuCatalog()
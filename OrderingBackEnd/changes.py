@@ -0,0 +1,156 @@
+"""
+Incremental sync of orders and the menu.
+
+Triggers from migration 0005 append a change_log row, numbered by an
+auto-increment seq, for every insert, update and delete on orders and
+food_items. GET /orders/changes and GET /api/food/changes return what
+changed after a client's position:
+- upserts with the row as it is now
+- tombstones for deletes
+- at most one entry per row
+
+To sync, call without `since` to get the current position, download the
+full list, then poll with since=<next>. prune records the highest seq it
+has removed; a position below it, 0 included, gets 410 and the client
+starts over.
+
+A seq is handed out when the write happens but only becomes visible at
+commit, so a later number can show up before an earlier one. A page
+therefore stops at a gap in the sequence until the gap is
+COMMIT_GRACE_SECONDS old. Gaps older than that are rolled-back writes.
+
+    python changes.py prune [--days N]    drop log entries older than N days
+"""
+import argparse
+import os
+from datetime import timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, select, update
+
+import models
+from database import engine
+
+log = models.ChangeLog.__table__
+state = models.ChangeLogState.__table__
+
+COMMIT_GRACE_SECONDS = float(os.getenv("CHANGES_COMMIT_GRACE_SECONDS", "5"))
+RETENTION_DAYS = int(os.getenv("CHANGES_RETENTION_DAYS", "7"))
+PRUNE_BATCH = 10000
+
+
+async def safe_head(db, since, now):
+    """
+    The highest seq up to which every entry after `since` is either
+    visible or a gap older than COMMIT_GRACE_SECONDS. Only the entries of
+    the last COMMIT_GRACE_SECONDS are walked, so this stays cheap however
+    far behind `since` is.
+    """
+    recent = (await db.scalars(
+        select(log.c.seq)
+        .where(log.c.seq > since, log.c.changed_at >= now - timedelta(seconds=COMMIT_GRACE_SECONDS))
+        .order_by(log.c.seq)
+    )).all()
+    if not recent:
+        return max(since, await db.scalar(select(func.coalesce(func.max(log.c.seq), 0))))
+
+    # Older entries are safe; a gap just before the first recent one may still commit
+    head = max(since, await db.scalar(select(func.coalesce(func.max(log.c.seq), 0)).where(log.c.seq < recent[0])))
+    for seq in recent:
+        if seq != head + 1:
+            break
+        head = seq
+    return head
+
+
+async def read_log(db, since, limit, entity, user_id=None):
+    """
+    Log rows of `entity` (and of `user_id`'s orders when given) after
+    `since` that are safe to hand out, oldest first, with the position to
+    resume from and whether more rows are waiting. The filter runs in SQL
+    on the (entity, seq) and (user_id, seq) indexes, so a page costs the
+    matching changes, not every write in between.
+    """
+    pruned = await db.scalar(select(state.c.pruned_seq).where(state.c.id == 1)) or 0
+    if since < pruned:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Position is older than the change log; resync.")
+
+    conditions = [log.c.seq > since, log.c.entity == entity]
+    if user_id is not None:
+        conditions.append(log.c.user_id == user_id)
+    rows = (await db.execute(
+        select(log.c.seq, log.c.entity_id, log.c.op)
+        .where(*conditions)
+        .order_by(log.c.seq)
+        .limit(limit + 1)
+    )).all()
+    now = await db.scalar(select(func.current_timestamp()))
+    head = await safe_head(db, since, now)
+
+    taken = [row for row in rows[:limit] if row.seq <= head]  # Later ones wait for an earlier write
+    if len(taken) < len(rows):
+        position = taken[-1].seq if taken else since
+        return taken, position, True
+    # Nothing else matched up to the safe head, so skip past the other writes
+    return taken, head, False
+
+
+async def feed(db, entity, since, limit, load, user_id=None):
+    """
+    Response body of a changes endpoint for `entity`. `load(db, ids)`
+    returns the current rows of those ids as {id: dict}; `user_id`
+    restricts orders to one customer's.
+    """
+    if since is None:
+        # Not below the prune mark even when pruning emptied the log
+        head = max(
+            await db.scalar(select(func.coalesce(func.max(log.c.seq), 0))),
+            await db.scalar(select(state.c.pruned_seq).where(state.c.id == 1)) or 0,
+        )
+        return {"changes": [], "next": head, "has_more": False}
+
+    taken, position, has_more = await read_log(db, since, limit, entity, user_id)
+    latest = {}
+    for row in taken:
+        latest[row.entity_id] = row  # Later changes to a row replace earlier ones
+
+    current = await load(db, [entity_id for entity_id, row in latest.items() if row.op == "upsert"])
+    changes = []
+    for entity_id, row in sorted(latest.items(), key=lambda item: item[1].seq):
+        if row.op == "delete":
+            changes.append({"seq": row.seq, "op": "delete", "id": entity_id})
+        elif entity_id in current:
+            changes.append({"seq": row.seq, "op": "upsert", "id": entity_id, "data": current[entity_id]})
+        # Otherwise it was deleted since; the tombstone is further along the log
+    return {"changes": changes, "next": position, "has_more": has_more}
+
+
+def prune(engine, days=RETENTION_DAYS):
+    """Delete log entries older than `days`, in batches; returns how many."""
+    with engine.connect() as conn:
+        cutoff = conn.scalar(select(func.current_timestamp())) - timedelta(days=days)
+    removed = 0
+    while True:
+        with engine.begin() as conn:
+            upto = conn.scalars(
+                select(log.c.seq).where(log.c.changed_at < cutoff).order_by(log.c.seq).limit(PRUNE_BATCH)
+            ).all()
+            if not upto:
+                return removed
+            removed += conn.execute(
+                delete(log).where(log.c.seq <= upto[-1], log.c.changed_at < cutoff)
+            ).rowcount
+            # Clients behind this mark have missed changes and must resync
+            conn.execute(update(state).where(state.c.id == 1, state.c.pruned_seq < upto[-1]).values(pruned_seq=upto[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["prune"])
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="keep this many days of changes")
+    args = parser.parse_args()
+    print(f"Pruned {prune(engine, args.days)} change log entries.")
+
+
+if __name__ == "__main__":
+    main()
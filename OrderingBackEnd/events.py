@@ -0,0 +1,201 @@
+"""
+In-process publish/subscribe of order changes, streamed to browsers as
+Server-Sent Events so the admin and customer order pages don't poll.
+
+Endpoints call publish() after committing an order change. Each event
+carries an id `<epoch>-<n>`. The last EVENT_REPLAY_SIZE events are kept,
+so a client that reconnects with Last-Event-ID gets what it missed. If the
+gap is older than the buffer, or the server restarted, it gets a "reset"
+event instead and should refetch.
+
+Every subscriber has a queue of EVENT_QUEUE_SIZE events. A subscriber that
+falls that far behind is dropped instead of slowing publishers down. Its
+stream ends, the browser's EventSource reconnects, and the replay buffer
+fills the gap.
+
+The bus only sees changes made by this process. Behind several workers,
+route the event streams and order writes to one worker, or put a shared
+broker behind publish().
+"""
+import asyncio
+import itertools
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+
+import fast_json
+
+EVENT_REPLAY_SIZE = int(os.getenv("EVENT_REPLAY_SIZE", "1000"))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "1000"))
+
+# A comment line this often keeps proxies from closing idle streams
+HEARTBEAT_SECONDS = 15.0
+# Reconnect delay suggested to EventSource, in milliseconds
+RETRY_MS = 3000
+
+EPOCH = os.urandom(4).hex()
+
+
+@dataclass(frozen=True)
+class Event:
+    seq: int
+    type: str
+    user_id: Optional[int]
+    data: bytes  # Encoded once, sent to every subscriber
+
+    @property
+    def id(self):
+        return f"{EPOCH}-{self.seq}"
+
+    def encode(self):
+        return b"id: %s\nevent: %s\ndata: %s\n\n" % (self.id.encode(), self.type.encode(), self.data)
+
+
+class Subscription:
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id  # None: every user's events
+        self.queue = asyncio.Queue(queue_size)
+        self.last_seq = 0
+
+    def wants(self, event):
+        return self.user_id is None or event.user_id == self.user_id
+
+
+class EventBus:
+    def __init__(self, replay_size=EVENT_REPLAY_SIZE, queue_size=EVENT_QUEUE_SIZE, max_subscribers=MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._buffer = deque(maxlen=replay_size)
+        self._subscribers = set()
+        self._seq = itertools.count(1)
+        # Publishers include sync endpoints in the threadpool
+        self._lock = threading.Lock()
+        self._loop = None
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, type, data, user_id=None):
+        self.publish_many([(type, data, user_id)])
+
+    def publish_many(self, events):
+        """Publish (type, data, user_id) tuples, e.g. one per order of a batch, with a single hand-off."""
+        with self._lock:
+            batch = [
+                Event(next(self._seq), type, user_id, fast_json.dumps(data))
+                for type, data, user_id in events
+            ]
+            self._buffer.extend(batch)
+            self.published += len(batch)
+            if self._loop is None or not self._subscribers:
+                return
+            try:
+                # Scheduled under the lock so batches reach subscribers in id order
+                self._loop.call_soon_threadsafe(self._dispatch, batch)
+            except RuntimeError:
+                self._loop = None  # The loop that subscribed has closed
+
+    def _dispatch(self, batch):
+        # Runs on the event loop
+        for subscription in list(self._subscribers):
+            for event in batch:
+                if not subscription.wants(event):
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self._drop(subscription)
+                    break
+
+    def _drop(self, subscription):
+        self._subscribers.discard(subscription)
+        self.dropped += 1
+        # Replace the backlog with the end-of-stream marker
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def subscribe(self, user_id=None, last_event_id=None):
+        """
+        Register a subscriber (on the event loop). Returns it with the
+        buffered events after `last_event_id`, or None for the replay when
+        those events are no longer available.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many event streams open; try again later.",
+                    headers={"Retry-After": str(RETRY_MS // 1000)},
+                )
+            self._loop = asyncio.get_running_loop()
+            subscription = Subscription(user_id, self.queue_size)
+            self._subscribers.add(subscription)
+
+            replay = []
+            if last_event_id:
+                epoch, _, seq = last_event_id.partition("-")
+                oldest = self._buffer[0].seq if self._buffer else self.published + 1
+                if epoch != EPOCH or not seq.isdigit() or int(seq) + 1 < oldest:
+                    replay = None
+                else:
+                    replay = [event for event in self._buffer if event.seq > int(seq) and subscription.wants(event)]
+        return subscription, replay
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "buffered": len(self._buffer),
+            "dropped_subscribers": self.dropped,
+        }
+
+
+bus = EventBus()
+
+
+def publish(type, data, user_id=None):
+    bus.publish(type, data, user_id)
+
+
+async def _stream(subscription, replay):
+    try:
+        yield b"retry: %d\n\n" % RETRY_MS
+        if replay is None:
+            yield b"event: reset\ndata: {}\n\n"
+            replay = []
+        for event in replay:
+            subscription.last_seq = event.seq
+            yield event.encode()
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if event is None:
+                return  # Fell behind; the client reconnects and replays
+            if event.seq <= subscription.last_seq:
+                continue  # Already sent from the replay
+            subscription.last_seq = event.seq
+            yield event.encode()
+    finally:
+        bus.unsubscribe(subscription)
+
+
+def stream(request, user_id=None):
+    """SSE response of the events for `user_id` (None: all of them), resuming after Last-Event-ID."""
+    subscription, replay = bus.subscribe(user_id, request.headers.get("last-event-id"))
+    return StreamingResponse(
+        _stream(subscription, replay),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
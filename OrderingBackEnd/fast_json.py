@@ -0,0 +1,85 @@
+"""
+JSON encoding and decoding for the whole API, using orjson when it is
+installed and the standard library otherwise.
+
+- FastJSONResponse is the app's default response class. Pydantic models
+  are serialized by pydantic's own (Rust) serializer; everything else goes
+  through orjson without jsonable_encoder.
+- model_response() returns an already-validated response model as-is,
+  skipping FastAPI's re-validation and jsonable_encoder pass.
+- FastJSONRoute parses JSON request bodies with the same codec.
+"""
+import json
+from decimal import Decimal
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib codec is used instead
+    orjson = None
+
+
+def _default(value):
+    # Types orjson doesn't know natively
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Serialize `content` to compact UTF-8 JSON bytes."""
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def model_response(model, status_code=200):
+    """Send a model that is already the endpoint's response_model without re-validating it."""
+    return FastJSONResponse(content=model, status_code=status_code)
+
+
+class FastJSONRequest(Request):
+    async def json(self):
+        if not hasattr(self, "_json"):
+            self._json = loads(await self.body())
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """APIRoute whose request bodies are decoded with loads()."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def fast_json_handler(request):
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return fast_json_handler
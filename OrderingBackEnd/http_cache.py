@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import select
+
+import fast_json
+import models
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+def dumps(content):
+    """Serialize like the API's responses do."""
+    return fast_json.dumps(content)
+
+
+class RenderedPayload:
+    """A JSON body rendered once, with compressed variants and strong ETags."""
+
+    def __init__(self, body, tag=None):
+        self.tag = tag or hashlib.sha256(body).hexdigest()[:32]
+        # Each content-coding is its own representation, so gets its own ETag
+        self.variants = {None: (body, f'"{self.tag}"')}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=6), f'"{self.tag}-gzip"')
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body), f'"{self.tag}-br"')
+
+    @classmethod
+    def from_content(cls, content, tag=None):
+        return cls(dumps(content), tag)
+
+    def etags(self):
+        return [etag for _, etag in self.variants.values()]
+
+
+def if_none_match(request: Request):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return set()
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def etag_matches(request: Request, etags):
+    tags = if_none_match(request)
+    return "*" in tags or any(etag in tags for etag in etags)
+
+
+def not_modified(etag, cache_control):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"})
+
+
+def choose_encoding(request: Request, payload):
+    accepted = request.headers.get("accept-encoding", "")
+    offered = {part.split(";")[0].strip().lower() for part in accepted.split(",")}
+    for encoding in ("br", "gzip"):
+        if encoding in offered and encoding in payload.variants:
+            return encoding
+    return None
+
+
+def payload_response(request: Request, payload, cache_control="no-cache"):
+    """304 if the client already holds any variant of `payload`, else the best encoding."""
+    encoding = choose_encoding(request, payload)
+    body, etag = payload.variants[encoding]
+    if etag_matches(request, payload.etags()):
+        return not_modified(etag, cache_control)
+
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def newest_seq(*conditions):
+    return (
+        select(models.ChangeLog.seq)
+        .where(*conditions)
+        .order_by(models.ChangeLog.seq.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+async def user_tag(db, kind, user_id, variant="", menu=None):
+    """
+    Tag for `kind` of the user's data, known from one index probe: the
+    newest change_log entry of their orders, which the triggers write
+    with every change and every worker sees. Take it before querying the
+    data. None when the user has no entries (never written, or pruned),
+    since the version is then unknown; the response is tagged by its
+    content instead.
+
+    Pass the menu catalog when the response shows menu names and prices:
+    the newest food_items entry joins the tag, and the catalog drops rows
+    older than it so they aren't served under the new tag.
+    """
+    user_version = newest_seq(models.ChangeLog.user_id == user_id)
+    if menu is None:
+        version = await db.scalar(select(user_version))
+    else:
+        # Both probes in one round trip
+        version, menu_version = (await db.execute(
+            select(user_version, newest_seq(models.ChangeLog.entity == "food_item"))
+        )).one()
+        if menu_version is None:
+            return None
+        menu.observe(menu_version)
+        version = None if version is None else f"{version}.{menu_version}"
+    if version is None:
+        return None
+    suffix = hashlib.sha1(variant.encode()).hexdigest()[:8] if variant else "0"
+    return f"{kind}-{user_id}-{version}-{suffix}"
+
+
+def check_not_modified(request: Request, tag, cache_control="private, no-cache"):
+    """A 304 response if the client holds any encoding of `tag`, else None."""
+    if tag is None:
+        return None
+    etags = [f'"{tag}"', f'"{tag}-gzip"', f'"{tag}-br"']
+    if etag_matches(request, etags):
+        return not_modified(etags[0], cache_control)
+    return None
+
+
+def user_data_response(request: Request, tag, content):
+    """Serve per-user JSON under a tag taken from user_tag() before the query (None: tag by content)."""
+    return payload_response(request, RenderedPayload.from_content(content, tag), cache_control="private, no-cache")
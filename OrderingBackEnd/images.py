@@ -0,0 +1,256 @@
+"""
+Resized variants of menu photos, rendered in a process pool after upload.
+
+For every photo we write thumb/card/full widths as WebP and progressive
+JPEG under static/images/variants, plus a tiny blurred JPEG placeholder
+inlined as a data URI. The result is stored as JSON in
+food_items.photo_variants:
+
+    {"placeholder": "data:image/jpeg;base64,...",
+     "thumb": {"width": 160, "height": 120, "webp": "/images/variants/x-thumb.webp",
+               "jpeg": "/images/variants/x-thumb.jpg"},
+     "card": {...}, "full": {...}}
+
+Pillow is optional: without it uploads keep working and photo_variants
+stays NULL.
+
+    python images.py backfill    render variants for photos that have none
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from sqlalchemy import bindparam, select, update
+
+import catalog
+import models
+import static_files
+from database import engine, open_async_session
+
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:  # Pillow is optional; photos are then served as uploaded
+    Image = None
+
+STATIC_DIR = "static"
+VARIANT_DIR = os.path.join(STATIC_DIR, "images", "variants")
+
+# Longest edge of each variant, in pixels
+VARIANT_WIDTHS = {"thumb": 160, "card": 480, "full": 1200}
+PLACEHOLDER_WIDTH = 16
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+def start_pool(mp_context=None):
+    """Create the worker pool; spawn rather than fork a process holding DB connections."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(IMAGE_WORKERS, mp_context=mp_context or get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def restart_pool(broken):
+    """
+    Replace a pool left unusable by a dead worker (out of memory, a crash
+    in Pillow, a failed import in the spawned process). Another caller may
+    have replaced it already; that pool is kept.
+    """
+    if _pool is broken:
+        shutdown_pool()
+    return start_pool()
+
+
+def _save(image, path, **options):
+    # Write beside the target and rename, so a half-written file is never served
+    temp_path = f"{path}.part"
+    image.save(temp_path, **options)
+    os.replace(temp_path, path)
+
+
+def render_variants(source_path, stem, out_dir=VARIANT_DIR):
+    """Write the variants of one photo and return the photo_variants dict (runs in a worker)."""
+    os.makedirs(out_dir, exist_ok=True)
+    url_dir = "/" + os.path.relpath(out_dir, STATIC_DIR).replace(os.sep, "/")
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    variants = {}
+    for name, width in VARIANT_WIDTHS.items():
+        resized = image.copy()
+        resized.thumbnail((width, width), Image.LANCZOS)  # Never upscales
+        webp_name = f"{stem}-{name}.webp"
+        jpeg_name = f"{stem}-{name}.jpg"
+        _save(resized, os.path.join(out_dir, webp_name), format="WEBP", quality=80, method=4)
+        _save(resized, os.path.join(out_dir, jpeg_name), format="JPEG", quality=82, progressive=True, optimize=True)
+        variants[name] = {
+            "width": resized.width,
+            "height": resized.height,
+            "webp": f"{url_dir}/{webp_name}",
+            "jpeg": f"{url_dir}/{jpeg_name}",
+        }
+
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    buffer = io.BytesIO()
+    tiny.filter(ImageFilter.GaussianBlur(1)).save(buffer, format="JPEG", quality=40)
+    variants["placeholder"] = "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+    return variants
+
+
+def photo_path(photo):
+    """Disk path of a FoodItem.photo URL such as /images/x.jpg."""
+    return os.path.join(STATIC_DIR, photo.lstrip("/"))
+
+
+def stem_of(photo):
+    return os.path.splitext(os.path.basename(photo))[0]
+
+
+async def build_variants(food_id, photo):
+    """Background task: render a new photo's variants and record them on the food item."""
+    await build_many_variants([(food_id, photo)])
+
+
+async def _render(pool, photo):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, render_variants, photo_path(photo), stem_of(photo))
+
+
+async def build_many_variants(items):
+    """Background task: render the photos of (food_id, photo) pairs in parallel and record them in one transaction."""
+    if Image is None or not items:
+        return
+    pool = start_pool()
+    results = await asyncio.gather(*(_render(pool, photo) for _, photo in items), return_exceptions=True)
+    broken = [index for index, result in enumerate(results) if isinstance(result, BrokenProcessPool)]
+    if broken:
+        # Every photo in flight fails with the dead worker; retry them once on a new pool
+        logger.warning("Image worker pool broke; retrying %d photos on a new pool", len(broken))
+        pool = restart_pool(pool)
+        retried = await asyncio.gather(*(_render(pool, items[index][1]) for index in broken), return_exceptions=True)
+        for index, result in zip(broken, retried):
+            results[index] = result
+        if any(isinstance(result, BrokenProcessPool) for result in retried):
+            restart_pool(pool)  # So the next upload doesn't inherit the dead pool
+
+    rendered = []
+    for (food_id, photo), variants in zip(items, results):
+        if isinstance(variants, Exception):
+            # The full-size photo still works; the backfill command can retry
+            logger.error("Could not render image variants for food item %s: %s", food_id, variants)
+            continue
+        rendered.append((food_id, photo, variants))
+    if not rendered:
+        return
+
+    table = models.FoodItem.__table__
+    db = open_async_session()
+    try:
+        # Only where the photo wasn't replaced meanwhile
+        await db.execute(
+            update(table)
+            .where(table.c.food_id == bindparam("b_food_id"), table.c.photo == bindparam("b_photo"))
+            .values(photo_variants=bindparam("b_variants")),
+            [
+                {"b_food_id": food_id, "b_photo": photo, "b_variants": json.dumps(variants)}
+                for food_id, photo, variants in rendered
+            ],
+        )
+        await db.commit()
+    finally:
+        await db.close()
+    for food_id, _, variants in rendered:
+        catalog.menu.invalidate(food_id)
+        # Re-rendered files keep their names, so drop any mapped copies
+        for variant in variants.values():
+            if isinstance(variant, dict):
+                for url in (variant["webp"], variant["jpeg"]):
+                    static_files.image_cache.invalidate(photo_path(url))
+
+
+def _submit(pool, photo):
+    try:
+        return pool.submit(render_variants, photo_path(photo), stem_of(photo))
+    except BrokenProcessPool as exc:  # A worker died while the rest were being queued
+        future = Future()
+        future.set_exception(exc)
+        return future
+
+
+def backfill(engine):
+    """Render variants for every food item whose photo has none yet."""
+    if Image is None:
+        raise SystemExit("Pillow is not installed")
+    with engine.connect() as conn:
+        pending = conn.execute(
+            select(models.FoodItem.food_id, models.FoodItem.photo)
+            .where(models.FoodItem.photo.is_not(None), models.FoodItem.photo_variants.is_(None))
+        ).all()
+
+    pending_files = [(food_id, photo) for food_id, photo in pending if os.path.exists(photo_path(photo))]
+    done = 0
+    for attempt in range(2):
+        pool = start_pool()
+        futures = [
+            (food_id, photo, _submit(pool, photo))
+            for food_id, photo in pending_files
+        ]
+        pending_files = []
+        for food_id, photo, future in futures:
+            try:
+                variants = future.result()
+            except BrokenProcessPool as exc:
+                if attempt == 0:
+                    pending_files.append((food_id, photo))  # Retried once on a new pool
+                else:
+                    logger.error("Skipping food item %s (%s): %s", food_id, photo, exc)
+                continue
+            except Exception as exc:
+                logger.error("Skipping food item %s (%s): %s", food_id, photo, exc)
+                continue
+            with engine.begin() as conn:
+                conn.execute(
+                    update(models.FoodItem.__table__)
+                    .where(models.FoodItem.food_id == food_id)
+                    .values(photo_variants=json.dumps(variants))
+                )
+            done += 1
+        if not pending_files:
+            break
+        logger.warning("Image worker pool broke; retrying %d photos on a new pool", len(pending_files))
+        restart_pool(pool)
+    shutdown_pool()
+    return done, len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    done, pending = backfill(engine)
+    print(f"Rendered variants for {done} of {pending} photos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,72 @@
+from contextlib import asynccontextmanager
 from multiprocessing import get_context
 import os
-import bcrypt
-from fastapi import FastAPI, File, Form, HTTPException, Depends, UploadFile, status
+from fastapi import BackgroundTasks, FastAPI, File, Form, HTTPException, Depends, Query, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Annotated, List, Optional
-from sqlalchemy import func
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Literal, Optional
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
-from datetime import date, datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+import best_sellers
+import cart
+import cart_store
+import catalog
+import changes
+import events
+import fast_json
+import http_cache
+import images
+import menu_import
+import migrate
 import models
-from database import SessionLocal, engine
-from fastapi.staticfiles import StaticFiles
-
-# Create the database tables if they don't exist
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
+import order_status
+import pagination
+import passwords
+import pool_stats
+import rollup
+import static_files
+import tokens
+import uploads
+from database import SessionLocal, engine, open_async_session
+
+# Bring the schema up to date; set DB_AUTO_MIGRATE=0 when `python migrate.py upgrade`
+# runs as a deploy step instead
+if os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes"):
+    migrate.upgrade(engine)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Worker processes for rendering photo variants
+    images.start_pool(get_context("spawn"))
+    # Load the menu catalog so the first page loads don't hit MySQL
+    db = open_async_session()
+    try:
+        await catalog.menu.load(db)
+        # Seed the best-seller counters from the daily sales rollup
+        await best_sellers.sales.seed(db)
+    finally:
+        await db.close()
+    yield
+    passwords.hasher.shutdown()
+    images.shutdown_pool()
+
+app = FastAPI(lifespan=lifespan, default_response_class=fast_json.FastJSONResponse)
+# JSON request bodies are parsed with the same codec; set before any route is declared
+app.router.route_class = fast_json.FastJSONRoute
+
+# Fingerprinted photos are served as immutable; hot menu images straight from memory maps
+app.mount(
+    "/static/images",
+    static_files.image_files("static/images", static_files.ImmutableStaticFiles(directory="static/images")),
+    name="images",
+)
+app.mount("/static", static_files.ImmutableStaticFiles(directory="static"),name="static")
 
-app.mount("/static", StaticFiles(directory="static"),name="static")
+# Turn away oversized photo uploads before their bodies are read. Added
+# before CORS so CORSMiddleware wraps it and its 413s carry CORS headers.
+app.add_middleware(uploads.UploadLimitMiddleware)
 
 # CORS configuration
 app.add_middleware(
@@ -39,10 +88,58 @@ def get_db():
 
 db_dependency = Annotated[Session, Depends(get_db)]
 
+# Dependency to get an async database session (a threaded sync session when DB_MODE=sync)
+async def get_async_db():
+    db = open_async_session()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
+
+# Claims of a valid bearer token, or None for clients that still send user_id
+token_claims = Annotated[Optional[dict], Depends(tokens.optional_claims)]
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the API!"}
 
+# Connection pool usage per engine, used to size pools per worker
+@app.get("/admin/db/pool-stats", dependencies=[Depends(tokens.require_admin)])
+def get_pool_stats():
+    return pool_stats.snapshot_all()
+
+# Size and hit/miss counters of the in-process menu catalog
+@app.get("/admin/catalog/stats", dependencies=[Depends(tokens.require_admin)])
+def get_catalog_stats():
+    return catalog.menu.stats()
+
+# Size and hit ratio of the memory-mapped image cache
+@app.get("/admin/static/image-cache", dependencies=[Depends(tokens.require_admin)])
+def get_image_cache_stats():
+    return static_files.image_cache.stats()
+
+# Backend and size of the write-behind cart store (CART_STORE)
+@app.get("/admin/carts/stats", dependencies=[Depends(tokens.require_admin)])
+def get_cart_store_stats():
+    return cart_store.store.stats() if cart_store.store is not None else {"backend": "db"}
+
+# Subscribers and throughput of the order event bus
+@app.get("/admin/events/stats", dependencies=[Depends(tokens.require_admin)])
+def get_event_stats():
+    return events.bus.stats()
+
+# Live feed of every order change, as Server-Sent Events
+@app.get("/admin/orders/events", dependencies=[Depends(tokens.require_stream_admin)])
+async def admin_order_events(request: Request):
+    return events.stream(request)
+
+# Queue depth, rejections and latency of the bcrypt worker pool
+@app.get("/admin/passwords/stats", dependencies=[Depends(tokens.require_admin)])
+def get_password_stats():
+    return passwords.hasher.stats()
+
 # Pydantic models for user operations
 class UserCreate(BaseModel):
     username: str
@@ -56,50 +153,57 @@ class LoginRequest(BaseModel):
 
 
 @app.post("/api/user/register", status_code=status.HTTP_201_CREATED)
-async def register_user(user: UserCreate, db: db_dependency):
+async def register_user(user: UserCreate, db: async_db_dependency):
     # Check if the username already exists
-    existing_user = db.query(models.User).filter(models.User.username == user.username).first()
+    existing_user = await db.scalar(select(models.User).where(models.User.username == user.username))
     if existing_user:
         return {"success": False, "message": "Username unavailable"}
 
-    # Hash the user's password
-    hashed_password = bcrypt.hashpw(user.password.encode("utf-8"), bcrypt.gensalt())
+    # Hash the user's password off the event loop
+    hashed_password = await passwords.hasher.hash(user.password)
 
     # Create the user
     db_user = models.User(
         username=user.username,
-        password=hashed_password.decode("utf-8"),
+        password=hashed_password,
         phone_number=user.phone_number,
         address=user.address,
     )
     db.add(db_user)
-    db.commit()
+    await db.commit()
 
-    # Return success with a dummy token
+    # Return success with a signed session token
     return {
         "success": True,
-        "token": "dummy-token",
+        "token": tokens.issue(db_user.user_id),
         "message": f"User '{user.username}' created successfully"
     }
 
 
 @app.post("/api/user/login")
-async def login_user(user: LoginRequest, db: db_dependency):
+async def login_user(user: LoginRequest, db: async_db_dependency):
     # Query the database for the user
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+    db_user = await db.scalar(select(models.User).where(models.User.username == user.username))
 
-    # Verify password
-    if not db_user or not bcrypt.checkpw(user.password.encode("utf-8"), db_user.password.encode("utf-8")):
+    # Verify password off the event loop
+    if not db_user or not await passwords.hasher.verify(user.password, db_user.password):
         return {"success": False, "message": "Invalid username or password"}
 
-    # Login successful - return a dummy token
+    # Login successful - return a signed session token
     return {
         "success": True,
-        "token": "dummy-token",
+        "token": tokens.issue(db_user.user_id),
         "message": f"Welcome, {db_user.username}!"
     }
 
 
+@app.post("/api/user/logout")
+def logout_user(claims: dict = Depends(tokens.require_claims)):
+    # Revoke this token; it would otherwise stay valid until it expires
+    tokens.revocations.revoke(claims)
+    return {"success": True, "message": "Logged out"}
+
+
 
 # add food item in the menu 
 class FoodItemCreate(BaseModel):
@@ -113,16 +217,17 @@ class FoodItemCreate(BaseModel):
 # Endpoint to create a food item
 @app.post("/fooditems/", status_code=status.HTTP_201_CREATED)
 async def create_food_item(
+    background_tasks: BackgroundTasks,
     name: str = Form(...),
     price: int = Form(...),
     description: str = Form(...),
     category_name: str = Form(...),
     price_to_make: int = Form(...),
     photo: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Check if the food item name already exists
-    existing_food_item = db.query(models.FoodItem).filter(models.FoodItem.name == name).first()
+    existing_food_item = await db.scalar(select(models.FoodItem).where(models.FoodItem.name == name))
     if existing_food_item:
         raise HTTPException(status_code=400, detail="A food item with this name already exists.")
     
@@ -133,12 +238,11 @@ async def create_food_item(
     
     # Sanitize the file name
     sanitized_name = name.replace(" ", "_")
-    file_name = f"{sanitized_name}.jpg"
-    file_path = f"static/images/{file_name}"
-    
-    with open(file_path, "wb") as file:
-        content = await photo.read()
-        file.write(content)
+
+    # Streamed to a temp file off the event loop, then renamed into place
+    # under a content-hashed name that is safe to cache forever
+    file_name = await uploads.save_upload(photo, sanitized_name, ".png" if file_extension == ".png" else ".jpg")
+    static_files.image_cache.invalidate(os.path.join(uploads.IMAGE_DIR, file_name))
     
     # Create a new FoodItem instance
     db_food_item = models.FoodItem(
@@ -151,8 +255,14 @@ async def create_food_item(
     )
     
     db.add(db_food_item)
-    db.commit()
-    db.refresh(db_food_item)
+    await db.commit()
+    await db.refresh(db_food_item)
+
+    # The next menu read reloads the catalog
+    catalog.menu.invalidate()
+
+    # Resized variants are rendered in the image process pool after we respond
+    background_tasks.add_task(images.build_variants, db_food_item.food_id, db_food_item.photo)
     
     return {
         "food_id": db_food_item.food_id,
@@ -162,9 +272,33 @@ async def create_food_item(
         "category_name": db_food_item.category_name,
         "price_to_make": db_food_item.price_to_make,
         "photo": db_food_item.photo,
+        "photo_variants": None,  # Filled in once the background render finishes
     }
 
 
+# Bulk import of a whole menu: CSV or NDJSON rows plus a zip of their photos
+@app.post("/fooditems/bulk", dependencies=[Depends(tokens.require_admin)])
+async def import_food_items(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    photos: Optional[UploadFile] = File(None),
+    atomic: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Validate every row, then insert the good ones in one transaction;
+    # with atomic=true any bad row rejects the whole file
+    report, created = await menu_import.import_menu(db, file, photos, atomic)
+
+    if created:
+        # One catalog refresh for the whole import
+        catalog.menu.invalidate()
+        await catalog.menu.load(db)
+        # All the photos' variants are rendered in one background job
+        background_tasks.add_task(images.build_many_variants, created)
+
+    return report
+
+
 #getting all fooditems from the database to show them for the admin
 
 class FoodItemResponse(BaseModel):
@@ -175,29 +309,44 @@ class FoodItemResponse(BaseModel):
     category_name: str
     price_to_make: int
     photo: str
+    photo_variants: Optional[dict] = None
 
     class Config:
         orm_mode = True
 
 @app.get("/api/food/list", response_model=dict)
-def get_all_food_items(db: Session = Depends(get_db)):
-    food_items = db.query(models.FoodItem).all()
-    food_items_response = [
-        FoodItemResponse(
-            food_id=item.food_id,
-            name=item.name,
-            price=item.price,
-            description=item.description,
-            category_name=item.category_name or "Unknown",  # Default to "Unknown" if None
-            price_to_make=item.price_to_make,
-            photo=item.photo,
-        )
-        for item in food_items
-    ]
+async def get_all_food_items(request: Request, db: async_db_dependency, category: Optional[str] = None):
+    # Pre-rendered bytes from the in-process catalog, 304 on a matching ETag
+    payload = await catalog.menu.payload(db, category)
+    if payload is not None:
+        return http_cache.payload_response(request, payload)
+
+    # Only a menu larger than the catalog bound is read from the database
+    query = select(models.FoodItem)
+    if category is not None:
+        query = query.where(models.FoodItem.category_name == category)
+    food_items = [catalog.to_row(item) for item in (await db.scalars(query)).all()]
+
+    food_items_response = [FoodItemResponse(**row) for row in food_items]
     return {"success": True, "data": food_items_response}
 
 
 
+# Menu items changed since a position from the change log, with tombstones for deleted ones
+@app.get("/api/food/changes")
+async def get_food_changes(
+    db: async_db_dependency,
+    since: Optional[int] = Query(None, ge=0),  # Omit to get the current position
+    limit: int = Query(500, ge=1, le=5000),
+):
+    async def load(db, food_ids):
+        items = (await db.scalars(select(models.FoodItem).where(models.FoodItem.food_id.in_(food_ids)))).all()
+        return {item.food_id: catalog.to_row(item) for item in items}
+
+    return await changes.feed(db, "food_item", since, limit, load)
+
+
+
 #delete food item from the database
 @app.delete("/fooditems/{food_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_food_item(food_id: int, db: Session = Depends(get_db)):
@@ -214,6 +363,7 @@ def delete_food_item(food_id: int, db: Session = Depends(get_db)):
     # Remove the food item from the database
     db.delete(food_item)
     db.commit()
+    catalog.menu.invalidate(food_id)
 
     return {"message": f"Food item with ID {food_id} has been deleted successfully"}
 
@@ -229,8 +379,12 @@ def update_order_status(
     status_update: OrderStatusUpdate,
     db: Session = Depends(get_db)
 ):
-    # Retrieve the order from the database
-    order = db.query(models.Orders).filter(models.Orders.order_id == order_id).first()
+    target = status_update.status
+    if target not in order_status.TRANSITIONS:
+        raise HTTPException(status_code=422, detail=f"Unknown order status '{target}'.")
+
+    # Retrieve the order from the database, locked so the rollup sees a stable status
+    order = db.query(models.Orders).filter(models.Orders.order_id == order_id).with_for_update().first()
 
     # If the order does not exist, raise a 404 error
     if not order:
@@ -239,13 +393,103 @@ def update_order_status(
             detail=f"Order with ID {order_id} not found."
         )
 
+    # Same rules as the batch endpoint; moving to the current status changes nothing
+    if order.status == target:
+        return {"message": f"Order {order_id} is already '{target}'"}
+    if target not in order_status.TRANSITIONS.get(order.status, ()):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Order {order_id} can't move from '{order.status}' to '{target}'.",
+        )
+
+    # Keep the daily sales rollup in step with moves into or out of a sold status
+    was_sold = order_status.is_sold(order.status)
+    is_sold = order_status.is_sold(status_update.status)
+    sold = []
+    if was_sold != is_sold:
+        sign = 1 if is_sold else -1
+        sold = db.execute(rollup.sales_select([models.OrderDetails.order_id == order_id], sign)).all()
+        db.execute(rollup.record_orders(db.bind.dialect.name, [order_id], sign))
+
     # Update the status of the order
+    previous_status = order.status
     order.status = status_update.status
     db.commit()  # Persist the changes in the database
+    best_sellers.sales.record(sold)
     db.refresh(order)  # Refresh the order instance
+    events.publish("order.status", {
+        "order_id": order_id, "user_id": order.user_id, "status": order.status, "previous": previous_status,
+    }, order.user_id)
 
     return {"message": f"Order {order_id} status updated to '{status_update.status}'"}
-    
+
+
+# Move many orders to one status at once, e.g. the kitchen marking a rush of orders ready
+class OrderStatusBatch(BaseModel):
+    order_ids: List[int] = Field(min_length=1, max_length=500)
+    status: str
+
+@app.put("/orders/status:batch", dependencies=[Depends(tokens.require_admin)])
+async def update_order_statuses(batch: OrderStatusBatch, db: async_db_dependency):
+    target = batch.status
+    if target not in order_status.TRANSITIONS:
+        raise HTTPException(status_code=422, detail=f"Unknown order status '{target}'.")
+    order_ids = list(dict.fromkeys(batch.order_ids))
+
+    # Lock the orders so the rollup sees stable statuses
+    current = {
+        row.order_id: row
+        for row in (await db.execute(
+            select(models.Orders.order_id, models.Orders.status, models.Orders.user_id)
+            .where(models.Orders.order_id.in_(order_ids))
+            .with_for_update()
+        )).all()
+    }
+
+    # Check every transition before changing anything
+    results, moving = [], []
+    for order_id in order_ids:
+        row = current.get(order_id)
+        if row is None:
+            results.append({"order_id": order_id, "result": "not_found"})
+        elif row.status == target:
+            results.append({"order_id": order_id, "result": "unchanged", "status": target})
+        elif target not in order_status.TRANSITIONS.get(row.status, ()):
+            results.append({"order_id": order_id, "result": "invalid_transition", "status": row.status})
+        else:
+            results.append({"order_id": order_id, "result": "updated", "from": row.status, "status": target})
+            moving.append(row)
+
+    sold = []
+    if moving:
+        # Orders entering or leaving the sold statuses go through the rollup in one statement
+        crossing = [row.order_id for row in moving if order_status.is_sold(row.status) != order_status.is_sold(target)]
+        if crossing:
+            sign = 1 if order_status.is_sold(target) else -1
+            sold = (await db.execute(
+                rollup.sales_select([models.OrderDetails.order_id.in_(crossing)], sign)
+            )).all()
+            await db.execute(rollup.record_orders(db.bind.dialect.name, crossing, sign))
+
+        # One UPDATE for the whole batch
+        await db.execute(
+            update(models.Orders.__table__)
+            .where(models.Orders.order_id.in_([row.order_id for row in moving]))
+            .values(status=target)
+        )
+        await db.commit()
+
+        best_sellers.sales.record(sold)
+        # One hand-off to the event bus for the whole batch
+        events.bus.publish_many([
+            ("order.status", {
+                "order_id": row.order_id, "user_id": row.user_id, "status": target, "previous": row.status,
+            }, row.user_id)
+            for row in moving
+        ])
+
+    return {"status": target, "updated": len(moving), "results": results}
+
 # add promocode
 
 class PromoCodeCreate(BaseModel):
@@ -305,8 +549,8 @@ def login_admin(login_request: AdminLoginRequest, db: Session = Depends(get_db))
     if login_request.password != admin_user.password:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password")
     
-    # Generate token (replace with proper JWT token generation)
-    token = "dummy-token-for-now"
+    # Signed admin session token
+    token = tokens.issue(admin_user.admin_id, admin=True)
 
     return AdminLoginResponse(success=True, message="Login successful", token=token)
 
@@ -326,9 +570,17 @@ def delete_order(order_id: int, db: Session = Depends(get_db)):
             detail=f"Order with ID {order_id} not found."
         )
 
+    # A sold order's sales leave the rollup with it
+    sold = []
+    if order_status.is_sold(order.status):
+        sold = db.execute(rollup.sales_select([models.OrderDetails.order_id == order_id], -1)).all()
+        db.execute(rollup.record_orders(db.bind.dialect.name, [order_id], -1))
+
     # Delete the order from the database
     db.delete(order)
     db.commit()
+    best_sellers.sales.record(sold)
+    events.publish("order.deleted", {"order_id": order_id, "user_id": order.user_id}, order.user_id)
 
     return {"message": f"Order with ID {order_id} has been deleted successfully"}
 
@@ -349,57 +601,127 @@ class OrderResponse(BaseModel):
         orm_mode = True  # Enable ORM-to-JSON conversion
 
 
-@app.get("/orders/", response_model=List[OrderResponse])
-def list_all_orders(db: Session = Depends(get_db)):
-    # Query all orders from the database
-    orders = db.query(models.Orders).all()
-    return orders
+class OrderPage(BaseModel):
+    items: List[OrderResponse]
+    next_cursor: Optional[str] = None
+    total_estimate: Optional[int] = None
 
 
-# get the best seller item from the last 7 days based on the order details table data
-@app.get("/best-seller/")
-def get_best_seller(db: Session = Depends(get_db)):
-    # Calculate the date 7 days ago
-    seven_days_ago = datetime.now().date() - timedelta(days=7)
-
-    # Query to get the total quantity of each food item sold in the last 7 days
-    best_seller_query = (
-        db.query(
-            models.OrderDetails.food_id,
-            func.sum(models.OrderDetails.quantity).label("total_quantity")
-        )
-        .join(models.Orders, models.OrderDetails.order_id == models.Orders.order_id)
-        .filter(models.Orders.order_date >= seven_days_ago)  # Filter by last 7 days
-        .group_by(models.OrderDetails.food_id)  # Group by food_id
-        .order_by(func.sum(models.OrderDetails.quantity).desc())  # Sort by total_quantity
-        .first()  # Get the top result
+@app.get("/orders/", response_model=OrderPage)
+async def list_all_orders(
+    db: async_db_dependency,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    user_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    # Newest first, paged by keyset on (order_date, order_id)
+    conditions = []
+    if status_filter is not None:
+        conditions.append(models.Orders.status == status_filter)
+    if user_id is not None:
+        conditions.append(models.Orders.user_id == user_id)
+    if date_from is not None:
+        conditions.append(models.Orders.order_date >= date_from)
+    if date_to is not None:
+        conditions.append(models.Orders.order_date <= date_to)
+
+    query = select(models.Orders).where(*conditions)
+    if cursor:
+        query = query.where(pagination.after_cursor(models.Orders.order_date, models.Orders.order_id, cursor))
+    query = query.order_by(models.Orders.order_date.desc(), models.Orders.order_id.desc()).limit(limit + 1)
+
+    orders, next_cursor = pagination.page_of((await db.scalars(query)).all(), limit)
+
+    # Cached per filter combination instead of a COUNT(*) per page
+    total_estimate = await pagination.order_counts.estimate(
+        db,
+        models.Orders.__table__,
+        (status_filter, user_id, date_from, date_to),
+        conditions,
     )
 
-    # If no items were sold in the last 7 days
-    if not best_seller_query:
-        raise HTTPException(
-            status_code=404, detail="No items sold in the last 7 days."
-        )
+    # Already validated: sent without FastAPI validating and encoding it again
+    return fast_json.model_response(OrderPage(
+        items=[OrderResponse.model_validate(order, from_attributes=True) for order in orders],
+        next_cursor=next_cursor,
+        total_estimate=total_estimate,
+    ))
+
+
+# Orders changed since a position from the change log, with tombstones for deleted ones
+@app.get("/orders/changes")
+async def get_order_changes(
+    db: async_db_dependency,
+    claims: token_claims,
+    since: Optional[int] = Query(None, ge=0),  # Omit to get the current position
+    limit: int = Query(500, ge=1, le=5000),
+    user_id: Optional[int] = None,
+):
+    # Admins follow every order (or one user's); customers their own
+    if not (claims and claims["adm"] and user_id is None):
+        user_id = tokens.resolve_user(claims, user_id)
+
+    async def load(db, order_ids):
+        orders = (await db.scalars(select(models.Orders).where(models.Orders.order_id.in_(order_ids)))).all()
+        return {
+            order.order_id: OrderResponse.model_validate(order, from_attributes=True).model_dump()
+            for order in orders
+        }
 
-    # Extract the best seller information
-    food_id, total_quantity = best_seller_query
+    return await changes.feed(db, "order", since, limit, load, user_id)
 
-    # Query to get the food item details
-    food_item = db.query(models.FoodItem).filter(models.FoodItem.food_id == food_id).first()
-    if not food_item:
+
+# get the best seller items over a window of days from the in-memory sales counters
+BEST_SELLER_WINDOWS = {"1d": 1, "7d": 7, "30d": 30}
+
+@app.get("/best-seller/")
+async def get_best_seller(
+    db: async_db_dependency,
+    window: Literal["1d", "7d", "30d"] = "7d",
+    top: Optional[int] = Query(None, ge=1, le=50),
+):
+    days = BEST_SELLER_WINDOWS[window]
+
+    # Counters are seeded from the rollup and bumped on completion; reseed
+    # only when they may have missed other workers' orders
+    if not best_sellers.sales.is_fresh():
+        await best_sellers.sales.seed(db)
+    ranking = best_sellers.sales.top(days, top or 1)
+
+    # If no items were sold in the window
+    if not ranking and top is None:
         raise HTTPException(
-            status_code=404, detail=f"Food item with ID {food_id} not found."
+            status_code=404, detail=f"No items sold in the last {days} days."
         )
 
-    # Return the best-seller details
-    return {
-        "food_id": food_id,
-        "name": food_item.name,
-        "total_quantity": total_quantity,
-        "description": food_item.description,
-        "price": food_item.price,
-        "photo": food_item.photo,
-    }
+    # Food item details come from the menu catalog
+    items = await catalog.menu.get_many(db, [food_id for food_id, _ in ranking])
+
+    best = [
+        {
+            "food_id": food_id,
+            "name": items[food_id]["name"],
+            "total_quantity": total_quantity,
+            "description": items[food_id]["description"],
+            "price": items[food_id]["price"],
+            "photo": items[food_id]["photo"],
+        }
+        for food_id, total_quantity in ranking
+        if food_id in items
+    ]
+
+    # Without `top`, return the single best seller as before
+    if top is None:
+        if not best:
+            food_id = ranking[0][0]
+            raise HTTPException(
+                status_code=404, detail=f"Food item with ID {food_id} not found."
+            )
+        return best[0]
+    return best
 
 
 @app.post("/stats/calculate-daily-net-income/", status_code=201)
@@ -407,43 +729,19 @@ def calculate_daily_net_income(db: Session = Depends(get_db)):
     # Get today's date
     today = date.today()
 
-    # Query to calculate total income (sum of price * quantity)
-    total_income_query = (
-        db.query(func.sum(models.FoodItem.price * models.OrderDetails.quantity))
-        .join(models.OrderDetails, models.FoodItem.food_id == models.OrderDetails.food_id)
-        .join(models.Orders, models.OrderDetails.order_id == models.Orders.order_id)
-        .filter(models.Orders.order_date == today)  # Filter by today's date
-        .scalar()
-    )
-    total_income = total_income_query or 0  # Handle null values
-
-    # Query to calculate total cost (sum of price_to_make * quantity)
-    total_cost_query = (
-        db.query(func.sum(models.FoodItem.price_to_make * models.OrderDetails.quantity))
-        .join(models.OrderDetails, models.FoodItem.food_id == models.OrderDetails.food_id)
-        .join(models.Orders, models.OrderDetails.order_id == models.Orders.order_id)
-        .filter(models.Orders.order_date == today)  # Filter by today's date
-        .scalar()
-    )
-    total_cost = total_cost_query or 0  # Handle null values
+    # Today's rows of the daily sales rollup: one per item sold
+    today_sales = db.query(models.DailyItemSales).filter(models.DailyItemSales.date == today).all()
+
+    # Total income (sum of price * quantity) and cost (sum of price_to_make * quantity)
+    total_income = sum(row.revenue for row in today_sales)
+    total_cost = sum(row.cost for row in today_sales)
 
     # Calculate net income
     net_income = total_income - total_cost
 
-    # Query to determine the plate of the day (most ordered food item)
-    plate_of_the_day_query = (
-        db.query(
-            models.OrderDetails.food_id,
-            func.sum(models.OrderDetails.quantity).label("total_quantity")
-        )
-        .join(models.Orders, models.OrderDetails.order_id == models.Orders.order_id)
-        .filter(models.Orders.order_date == today)  # Filter by today's date
-        .group_by(models.OrderDetails.food_id)  # Group by food_id
-        .order_by(func.sum(models.OrderDetails.quantity).desc())  # Sort by total_quantity
-        .first()  # Get the top result
-    )
-
-    plate_of_the_day = plate_of_the_day_query[0] if plate_of_the_day_query else None
+    # The plate of the day is the most ordered food item
+    sold = [row for row in today_sales if row.qty > 0]
+    plate_of_the_day = max(sold, key=lambda row: row.qty).food_id if sold else None
 
     # Create a new Stats record
     stats_entry = models.Stats(
@@ -469,77 +767,66 @@ def calculate_daily_net_income(db: Session = Depends(get_db)):
 class AddToCartRequest(BaseModel):
     food_id: int
     quantity: int
-    user_id: int
+    user_id: Optional[int] = None  # Taken from the bearer token when omitted
 
 @app.post("/cart/add", status_code=status.HTTP_201_CREATED)
 async def add_to_cart(
     cart_item: AddToCartRequest,
-    db: Session = Depends(get_db),
+    db: async_db_dependency,
+    claims: token_claims,
 ):
-    user_id = cart_item.user_id  # Extract user_id from request body
-
-    # Fetch the user's active order (status: "pending")
-    order = db.query(models.Orders).filter(
-        models.Orders.user_id == user_id,
-        models.Orders.status == "pending",
-    ).first()
-
-    # If no active order exists, create one
-    if not order:
-        order = models.Orders(
-            user_id=user_id,
-            status="pending",
-            order_date=date.today(),
-            total_food_price=0,
-            delivery_fee=5000,  # Example delivery fee
-        )
-        db.add(order)
-        db.commit()
-        db.refresh(order)
-
-    # Check if the food item is already in the order
-    order_detail = db.query(models.OrderDetails).filter(
-        models.OrderDetails.order_id == order.order_id,
-        models.OrderDetails.food_id == cart_item.food_id,
-    ).first()
-
-    if order_detail:
-        # Update the quantity if the item is already in the cart
-        order_detail.quantity += cart_item.quantity
-    else:
-        # Add the food item to the order
-        new_order_detail = models.OrderDetails(
-            order_id=order.order_id,
-            food_id=cart_item.food_id,
-            quantity=cart_item.quantity,
-        )
-        db.add(new_order_detail)
-
-    # Update the total food price
-    food_item = db.query(models.FoodItem).filter(models.FoodItem.food_id == cart_item.food_id).first()
-    if not food_item:
-        raise HTTPException(status_code=404, detail="Food item not found")
-
-    order.total_food_price += food_item.price * cart_item.quantity
-
-    db.commit()
+    user_id = tokens.resolve_user(claims, cart_item.user_id)
+    if cart_item.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+
+    if cart_store.store is not None:
+        # Write-behind cart: nothing reaches the database until checkout
+        if not await catalog.menu.get(db, cart_item.food_id):
+            raise HTTPException(status_code=404, detail="Food item not found")
+        await cart_store.store.add(user_id, cart_item.food_id, cart_item.quantity)
+        events.publish("cart.updated", {
+            "user_id": user_id, "food_id": cart_item.food_id, "change": cart_item.quantity,
+        }, user_id)
+        return {"message": "Item added to cart successfully"}
+
+    # Price comes from the menu catalog when it holds the item
+    food_item = catalog.menu.peek(cart_item.food_id)
+    price = food_item["price"] if food_item else None
+
+    # Lock, upsert and total update happen in one transaction
+    order_id = await cart.add_item(db, user_id, cart_item.food_id, cart_item.quantity, price)
+    events.publish("cart.updated", {
+        "user_id": user_id, "order_id": order_id, "food_id": cart_item.food_id, "change": cart_item.quantity,
+    }, user_id)
     return {"message": "Item added to cart successfully"}
 
 # Define the request model for removing a cart item
 class RemoveFromCartRequest(BaseModel):
     food_id: int
-    user_id: int
+    user_id: Optional[int] = None  # Taken from the bearer token when omitted
 
 @app.delete("/cart/remove", status_code=status.HTTP_200_OK)
 async def remove_from_cart(
     cart_item: RemoveFromCartRequest,
-    db: Session = Depends(get_db),
+    db: async_db_dependency,
+    claims: token_claims,
 ):
+    user_id = tokens.resolve_user(claims, cart_item.user_id)
+
+    if cart_store.store is not None:
+        if await cart_store.store.remove_one(user_id, cart_item.food_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Food item not found in the cart."
+            )
+        events.publish("cart.updated", {"user_id": user_id, "food_id": cart_item.food_id, "change": -1}, user_id)
+        return {"message": "Item quantity reduced in cart successfully"}
+
     # Fetch the user's active order (status: "pending")
-    order = db.query(models.Orders).filter(
-        models.Orders.user_id == cart_item.user_id,
+    order = await db.scalar(select(models.Orders).where(
+        models.Orders.user_id == user_id,
         models.Orders.status == "pending",
-    ).first()
+    ))
 
     if not order:
         raise HTTPException(
@@ -548,10 +835,10 @@ async def remove_from_cart(
         )
 
     # Check if the food item exists in the order
-    order_detail = db.query(models.OrderDetails).filter(
+    order_detail = await db.scalar(select(models.OrderDetails).where(
         models.OrderDetails.order_id == order.order_id,
         models.OrderDetails.food_id == cart_item.food_id,
-    ).first()
+    ))
 
     if not order_detail:
         raise HTTPException(
@@ -560,66 +847,74 @@ async def remove_from_cart(
         )
 
     # Update the total food price
-    food_item = db.query(models.FoodItem).filter(models.FoodItem.food_id == cart_item.food_id).first()
+    food_item = await catalog.menu.get(db, cart_item.food_id)
     if not food_item:
         raise HTTPException(status_code=404, detail="Food item not found")
 
     # Decrease the quantity by 1
     order_detail.quantity -= 1
-    order.total_food_price -= food_item.price
+    order.total_food_price -= food_item["price"]
 
     # If the quantity reaches zero, remove the item from the order details
     if order_detail.quantity <= 0:
-        db.delete(order_detail)
+        await db.delete(order_detail)
+
+    # Flush so the count below no longer sees a deleted line item
+    await db.flush()
 
     # If the order is now empty, delete the order
-    remaining_items = db.query(models.OrderDetails).filter(
-        models.OrderDetails.order_id == order.order_id
-    ).count()
+    remaining_items = await db.scalar(
+        select(func.count()).select_from(models.OrderDetails).where(
+            models.OrderDetails.order_id == order.order_id
+        )
+    )
 
     if remaining_items == 0:
-        db.delete(order)
+        await db.delete(order)
 
-    db.commit()
+    await db.commit()
+    events.publish("cart.updated", {
+        "user_id": user_id, "order_id": order.order_id, "food_id": cart_item.food_id, "change": -1,
+    }, user_id)
     return {"message": "Item quantity reduced in cart successfully"}
 
 @app.get("/cart", status_code=status.HTTP_200_OK)
 async def view_cart(
-    user_id: int,  # Ideally passed in via an authenticated session
-    db: Session = Depends(get_db),
+    request: Request,
+    db: async_db_dependency,
+    claims: token_claims,
+    user_id: Optional[int] = None,  # Taken from the bearer token when omitted
 ):
-    # Fetch the user's active order
-    order = db.query(models.Orders).filter(
-        models.Orders.user_id == user_id,
-        models.Orders.status == "pending",
-    ).first()
+    user_id = tokens.resolve_user(claims, user_id)
 
-    if not order:
-        return {"message": "Your cart is empty", "items": []}
-
-    # Fetch all items in the order
-    order_details = db.query(models.OrderDetails).filter(
-        models.OrderDetails.order_id == order.order_id
-    ).all()
-
-    cart_items = []
-    for detail in order_details:
-        food_item = db.query(models.FoodItem).filter(models.FoodItem.food_id == detail.food_id).first()
-        cart_items.append({
-            "food_id": detail.food_id,
-            "name": food_item.name,
-            "quantity": detail.quantity,
-            "price_per_item": food_item.price,
-            "total_price": food_item.price * detail.quantity,
-        })
+    # Unchanged since the client's copy, and the menu too: answer 304 after
+    # one round trip. A cart store's carts aren't in the change log; they
+    # are tagged by content.
+    if cart_store.store is None:
+        tag = await http_cache.user_tag(db, "cart", user_id, menu=catalog.menu)
+    else:
+        tag = None
+        await catalog.menu.sync(db)  # Prices other workers changed still show up
+    cached = http_cache.check_not_modified(request, tag)
+    if cached is not None:
+        return cached
+
+    if cart_store.store is not None:
+        cart_view = await cart_store.read_cart(db, cart_store.store, user_id)
+    else:
+        # Fetch the user's active order and its items in one round trip
+        cart_view = await cart.read_cart(db, user_id)
 
-    return {
-        "order_id": order.order_id,
-        "items": cart_items,
-        "total_food_price": order.total_food_price,
-        "delivery_fee": order.delivery_fee,
-        "grand_total": order.total_food_price + order.delivery_fee,
-    }
+    if not cart_view:
+        cart_view = {"message": "Your cart is empty", "items": []}
+
+    return http_cache.user_data_response(request, tag, cart_view)
+
+class OrderHistoryItem(BaseModel):
+    food_id: int
+    name: Optional[str]
+    quantity: int
+    price_per_item: Optional[int]
 
 class OrderHistoryResponse(BaseModel):
     order_id: int
@@ -628,47 +923,99 @@ class OrderHistoryResponse(BaseModel):
     delivery_fee: int
     status: str
     grand_total: int
+    items: Optional[List[OrderHistoryItem]] = None
 
     class Config:
         orm_mode = True
 
-@app.get("/orders/history", response_model=List[OrderHistoryResponse])
-async def get_order_history(user_id: int, db: Session = Depends(get_db)):
-    # Fetch the user's orders, sorted by order_date in descending order
-    orders = db.query(models.Orders).filter(
-        models.Orders.user_id == user_id
-    ).order_by(models.Orders.order_date.desc()).all()
+class OrderHistoryPage(BaseModel):
+    orders: List[OrderHistoryResponse]
+    next_cursor: Optional[str] = None
+
+@app.get("/orders/history", response_model=OrderHistoryPage)
+async def get_order_history(
+    request: Request,
+    db: async_db_dependency,
+    claims: token_claims,
+    user_id: Optional[int] = None,  # Taken from the bearer token when omitted
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_items: bool = False,
+):
+    user_id = tokens.resolve_user(claims, user_id)
+
+    # Unchanged since the client's copy: answer 304 after one index probe
+    tag = await http_cache.user_tag(
+        db, "history", user_id, f"{limit}|{cursor}|{include_items}", catalog.menu if include_items else None
+    )
+    cached = http_cache.check_not_modified(request, tag)
+    if cached is not None:
+        return cached
+
+    # Newest first, paged by keyset over the (user_id, order_date, order_id) index
+    query = select(models.Orders).where(models.Orders.user_id == user_id)
+    if cursor:
+        query = query.where(pagination.after_cursor(models.Orders.order_date, models.Orders.order_id, cursor))
+    query = query.order_by(models.Orders.order_date.desc(), models.Orders.order_id.desc()).limit(limit + 1)
+
+    orders, next_cursor = pagination.page_of((await db.scalars(query)).all(), limit)
 
-    if not orders:
-        return {"message": "No order history found", "orders": []}
+    # Line items for the whole page in one query
+    lines = await cart.read_order_lines(db, [order.order_id for order in orders]) if include_items else {}
 
     # Prepare response with calculated grand_total for each order
     order_history = []
     for order in orders:
-        order_history.append({
-            "order_id": order.order_id,
-            "order_date": order.order_date,
-            "total_food_price": order.total_food_price,
-            "delivery_fee": order.delivery_fee,
-            "status": order.status,
-            "grand_total": order.total_food_price + order.delivery_fee,
-        })
+        order_history.append(OrderHistoryResponse(
+            order_id=order.order_id,
+            order_date=order.order_date,
+            total_food_price=order.total_food_price,
+            delivery_fee=order.delivery_fee,
+            status=order.status,
+            grand_total=order.total_food_price + order.delivery_fee,
+            items=lines.get(order.order_id),
+        ))
+
+    return http_cache.user_data_response(
+        request, tag, OrderHistoryPage(orders=order_history, next_cursor=next_cursor)
+    )
 
-    return order_history
+# Live changes to the customer's own cart and orders, as Server-Sent Events
+@app.get("/orders/events")
+async def order_events(
+    request: Request,
+    claims: Annotated[Optional[dict], Depends(tokens.optional_stream_claims)],
+    user_id: Optional[int] = None,  # Taken from the token when omitted
+):
+    user_id = tokens.resolve_user(claims, user_id)
+    return events.stream(request, user_id)
 
 @app.post("/orders/complete", status_code=status.HTTP_200_OK)
 async def complete_order(
-    user_id: int,
-    db: Session = Depends(get_db),
+    db: async_db_dependency,
+    claims: token_claims,
+    user_id: Optional[int] = None,  # Taken from the bearer token when omitted
 ):
+    user_id = tokens.resolve_user(claims, user_id)
+
     # Debug: Print user_id and database state
     print(f"Completing order for user_id: {user_id}")
+
+    if cart_store.store is not None:
+        # Order, lines and sales rollup written from the stored cart in one transaction
+        order, sold = await cart_store.checkout(db, cart_store.store, user_id)
+        best_sellers.sales.record(sold)
+        # The whole row, so the admin list can show it without a refetch
+        events.publish("order.completed", {
+            "order_id": order["order_id"], "user_id": user_id, "order": OrderResponse(**order).model_dump(),
+        }, user_id)
+        return {"message": f"Order {order['order_id']} has been successfully completed."}
     
     # Check for active order
-    order = db.query(models.Orders).filter(
+    order = await db.scalar(select(models.Orders).where(
         models.Orders.user_id == user_id,
         models.Orders.status == "pending"
-    ).first()
+    ))
 
     if not order:
         print("No active order found for user_id:", user_id)
@@ -677,9 +1024,25 @@ async def complete_order(
             detail="No active order found."
         )
 
-    # Update order status
-    order.status = "completed"
-    db.commit()
+    # Update order status; guarded on "pending" so that of two concurrent
+    # completions only one counts the order's sales
+    completed = await db.execute(
+        update(models.Orders.__table__)
+        .where(models.Orders.order_id == order.order_id, models.Orders.status == "pending")
+        .values(status="completed")
+    )
+    sold = []
+    if completed.rowcount == 1:
+        sold = (await db.execute(
+            rollup.sales_select([models.OrderDetails.order_id == order.order_id])
+        )).all()
+        await db.execute(rollup.record_orders(db.bind.dialect.name, [order.order_id]))
+    await db.commit()
+    best_sellers.sales.record(sold)
+    if completed.rowcount == 1:
+        # The whole row, so the admin list can show it without a refetch
+        row = OrderResponse.model_validate(order, from_attributes=True).model_dump() | {"status": "completed"}
+        events.publish("order.completed", {"order_id": order.order_id, "user_id": user_id, "order": row}, user_id)
 
     # Debug: Confirmation message for order completion
     print(f"Order {order.order_id} marked as completed.")
@@ -0,0 +1,239 @@
+"""
+Bulk menu import behind POST /fooditems/bulk.
+
+The menu is a CSV file with a header row, or NDJSON with one object per
+line, carrying the FoodItemCreate fields; `photo` names an image inside the
+accompanying zip. Every row is checked before anything is written: field
+validation, duplicates within the file, then one IN query each for names
+already on the menu and for unknown categories. Photos of the rows that
+pass are stored under fingerprinted names, and the rows go in with
+executemany in chunks of IMPORT_CHUNK_SIZE inside a single transaction.
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+import zlib
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+
+import fast_json
+import models
+import uploads
+
+IMPORT_CHUNK_SIZE = 500
+MAX_IMPORT_ROWS = int(os.getenv("MAX_IMPORT_ROWS", "5000"))
+
+# Accepted photo extensions and the one they are stored under
+PHOTO_EXTENSIONS = {".jpg": ".jpg", ".jpeg": ".jpg", ".png": ".png"}
+
+
+class ImportRow(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    name: str = Field(min_length=1, max_length=50)
+    price: int = Field(ge=0)
+    description: str = Field(max_length=200)
+    category_name: str = Field(min_length=1, max_length=100)
+    price_to_make: int = Field(ge=0)
+    photo: str = Field(min_length=1)
+
+
+def read_rows(file, filename):
+    """
+    Parse the uploaded menu file (blocking). Returns (row number, dict or
+    error message) pairs, numbered by line in the file.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in (".csv", ".ndjson", ".jsonl"):
+        raise HTTPException(status_code=400, detail="The menu file must be .csv or .ndjson.")
+    try:
+        text = file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="The menu file must be UTF-8 encoded.")
+
+    rows = []
+    if extension == ".csv":
+        reader = csv.DictReader(io.StringIO(text, newline=""))
+        for record in reader:
+            # Columns past the header end up under the None key
+            rows.append((reader.line_num, "Row has more fields than the header." if None in record else record))
+    else:
+        for line, raw in enumerate(text.splitlines(), 1):
+            if not raw.strip():
+                continue
+            try:
+                record = fast_json.loads(raw)
+            except ValueError:
+                rows.append((line, "Not valid JSON."))
+                continue
+            rows.append((line, record if isinstance(record, dict) else "Each line must be a JSON object."))
+
+    if not rows:
+        raise HTTPException(status_code=400, detail="The menu file has no rows.")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_IMPORT_ROWS} rows can be imported at once.",
+        )
+    return rows
+
+
+def validate_rows(rows):
+    """Field checks and in-file duplicate names; returns ({row: ImportRow}, {row: error})."""
+    items, errors, seen = {}, {}, {}
+    for line, record in rows:
+        if isinstance(record, str):
+            errors[line] = record
+            continue
+        try:
+            item = ImportRow.model_validate(record)
+        except ValidationError as exc:
+            errors[line] = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in exc.errors()
+            )
+            continue
+        if os.path.splitext(item.photo)[1].lower() not in PHOTO_EXTENSIONS:
+            errors[line] = "photo: only JPG, JPEG and PNG are allowed"
+            continue
+        key = item.name.casefold()
+        if key in seen:
+            errors[line] = f"name: duplicate of row {seen[key]}"
+            continue
+        seen[key] = line
+        items[line] = item
+    return items, errors
+
+
+async def check_against_menu(db, items, errors):
+    """Move rows whose name exists or whose category doesn't into `errors`, with one query each."""
+    names = {item.name for item in items.values()}
+    categories = {item.category_name for item in items.values()}
+    taken = {
+        name.casefold()
+        for name in (await db.scalars(select(models.FoodItem.name).where(models.FoodItem.name.in_(names)))).all()
+    }
+    known = set((await db.scalars(
+        select(models.Category.category_name).where(models.Category.category_name.in_(categories))
+    )).all())
+
+    for line, item in list(items.items()):
+        if item.name.casefold() in taken:
+            errors[line] = "name: a food item with this name already exists"
+        elif item.category_name not in known:
+            errors[line] = f"category_name: unknown category {item.category_name!r}"
+        else:
+            continue
+        del items[line]
+
+
+def store_photos(archive, items, errors):
+    """
+    Save each remaining row's photo from the zip (blocking) and return
+    {row: stored file name}. Rows whose photo is missing or unreadable
+    move to `errors`.
+    """
+    try:
+        bundle = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="photos must be a zip archive.")
+
+    stored = {}
+    with bundle:
+        # Matched by file name, wherever it sits in the archive
+        members = {os.path.basename(info.filename): info for info in bundle.infolist() if not info.is_dir()}
+        for line, item in list(items.items()):
+            info = members.get(os.path.basename(item.photo))
+            extension = PHOTO_EXTENSIONS[os.path.splitext(item.photo)[1].lower()]
+            try:
+                if info is None:
+                    errors[line] = f"photo: {item.photo} is not in the archive"
+                elif info.file_size > uploads.MAX_UPLOAD_BYTES:
+                    errors[line] = f"photo: {uploads.too_large().detail}"
+                else:
+                    with bundle.open(info) as source:
+                        # store_file enforces the size limit on the inflated bytes as well
+                        stored[line] = uploads.store_file(source, re.sub(r"[^\w.-]", "_", item.name), extension)
+                    continue
+            except HTTPException as exc:
+                errors[line] = f"photo: {exc.detail}"
+            except (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError):
+                # Corrupt, encrypted or an unsupported compression method
+                errors[line] = f"photo: could not read {item.photo} from the archive"
+            del items[line]
+    return stored
+
+
+async def import_menu(db, menu_file, photos, atomic=False):
+    """
+    Run the whole import and return (report, created) where created is a
+    list of (food_id, photo URL). With `atomic`, any bad row fails the
+    import with 422 and nothing is inserted.
+    """
+    rows = await run_in_threadpool(read_rows, menu_file.file, menu_file.filename)
+    items, errors = validate_rows(rows)
+    if items:
+        await check_against_menu(db, items, errors)
+
+    def report(results, created=0):
+        return {"success": not errors, "created": created, "failed": len(errors), "rows": results}
+
+    def failures():
+        return [{"row": line, "status": "error", "error": error} for line, error in errors.items()]
+
+    if atomic and errors:
+        raise HTTPException(status_code=422, detail=report(sorted(failures(), key=lambda result: result["row"])))
+
+    stored = {}
+    if items:
+        if photos is None:
+            for line in items:
+                errors[line] = "photo: no photo archive was uploaded"
+            items = {}
+        else:
+            # A failed import can leave photo files behind; their names are
+            # content hashes, so a retry reuses them
+            stored = await run_in_threadpool(store_photos, photos.file, items, errors)
+    if atomic and errors:
+        raise HTTPException(status_code=422, detail=report(sorted(failures(), key=lambda result: result["row"])))
+
+    values = [
+        {
+            "name": item.name,
+            "price": item.price,
+            "description": item.description,
+            "category_name": item.category_name,
+            "price_to_make": item.price_to_make,
+            "photo": f"/images/{stored[line]}",
+        }
+        for line, item in items.items()
+    ]
+    ids = {}
+    if values:
+        table = models.FoodItem.__table__
+        try:
+            for start in range(0, len(values), IMPORT_CHUNK_SIZE):
+                await db.execute(insert(table), values[start:start + IMPORT_CHUNK_SIZE])
+            # executemany doesn't hand back keys; read them in one go
+            ids = dict((await db.execute(
+                select(table.c.name, table.c.food_id).where(table.c.name.in_([row["name"] for row in values]))
+            )).all())
+            await db.commit()
+        except IntegrityError:
+            # Someone added one of these names since we checked
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="The menu changed during the import; please retry.")
+
+    results = failures()
+    created = []
+    for line, row in zip(items, values):
+        food_id = ids[row["name"]]
+        created.append((food_id, row["photo"]))
+        results.append({"row": line, "status": "created", "food_id": food_id, "name": row["name"], "photo": row["photo"]})
+    results.sort(key=lambda result: result["row"])
+    return report(results, len(created)), created
@@ -0,0 +1,216 @@
+"""
+Schema migration CLI.
+
+    python migrate.py upgrade            apply pending migrations
+    python migrate.py current            show the applied version
+    python migrate.py history            list migrations and whether they ran
+    python migrate.py explain [--strict] check the hot queries use their indexes
+
+Uses DATABASE_URL like the app does.
+"""
+import argparse
+import importlib
+import pkgutil
+import re
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, text
+
+import migrations
+import models
+import rollup
+from database import engine
+
+MIGRATION_LOCK = "orderingschema_migrations"
+
+version_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', version_metadata,
+    Column('version', String(32), primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime),
+)
+
+
+def discover():
+    """All migration modules as (version, module), oldest first."""
+    found = []
+    for info in pkgutil.iter_modules(migrations.__path__):
+        match = re.match(r"(\d{4})_\w+$", info.name)
+        if match:
+            found.append((match.group(1), importlib.import_module(f"migrations.{info.name}")))
+    return sorted(found, key=lambda item: item[0])
+
+
+def applied_versions(conn):
+    version_metadata.create_all(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+@contextmanager
+def migration_lock(engine):
+    """Serialize upgrades when several workers start at once (MySQL only)."""
+    if engine.dialect.name != "mysql":
+        yield
+        return
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT GET_LOCK(:name, 300)"), {"name": MIGRATION_LOCK}).scalar():
+            raise RuntimeError("Timed out waiting for the migration lock")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK})
+
+
+def upgrade(engine, verbose=False):
+    """Apply every pending migration, each in its own transaction."""
+    with migration_lock(engine):
+        with engine.begin() as conn:
+            done = applied_versions(conn)
+        for version, module in discover():
+            if version in done:
+                continue
+            if verbose:
+                print(f"Applying {version}: {module.description}")
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=module.description,
+                    applied_at=datetime.now(),
+                ))
+
+
+def hot_queries():
+    """(name, statement, table, acceptable index names) for the hot paths."""
+    Orders, OrderDetails = models.Orders, models.OrderDetails
+    newest_first = (Orders.order_date.desc(), Orders.order_id.desc())
+    return [
+        (
+            "pending cart lookup",
+            select(Orders.order_id).where(Orders.user_id == 1, Orders.status == "pending"),
+            "orders", {"ix_orders_user_id_status"},
+        ),
+        (
+            "admin order listing",
+            select(Orders).order_by(*newest_first).limit(50),
+            "orders", {"ix_orders_order_date_order_id"},
+        ),
+        (
+            "admin order listing by status",
+            select(Orders).where(Orders.status == "completed").order_by(*newest_first).limit(50),
+            "orders", {"ix_orders_status_order_date_order_id"},
+        ),
+        (
+            "customer order history",
+            select(Orders).where(Orders.user_id == 1).order_by(*newest_first).limit(20),
+            "orders", {"ix_orders_user_id_order_date_order_id"},
+        ),
+        (
+            "cart line items",
+            select(OrderDetails).where(OrderDetails.order_id == 1),
+            "order_details", {"PRIMARY"},
+        ),
+        (
+            "sales of the day",
+            select(models.DailyItemSales).where(models.DailyItemSales.date == date.today()),
+            "daily_item_sales", {"PRIMARY"},
+        ),
+        (
+            "best-seller counters seed",
+            select(models.DailyItemSales.date, models.DailyItemSales.food_id, models.DailyItemSales.qty)
+            .where(models.DailyItemSales.date >= date.today() - timedelta(days=30)),
+            "daily_item_sales", {"PRIMARY"},
+        ),
+        (
+            "changes since a position",
+            select(models.ChangeLog).where(models.ChangeLog.seq > 1, models.ChangeLog.entity == "food_item")
+            .order_by(models.ChangeLog.seq).limit(500),
+            "change_log", {"ix_change_log_entity_seq"},
+        ),
+        (
+            "customer's order changes",
+            select(models.ChangeLog)
+            .where(models.ChangeLog.seq > 1, models.ChangeLog.entity == "order", models.ChangeLog.user_id == 1)
+            .order_by(models.ChangeLog.seq).limit(500),
+            "change_log", {"ix_change_log_user_id_seq"},
+        ),
+        (
+            "user ETag version",
+            select(models.ChangeLog.seq).where(models.ChangeLog.user_id == 1)
+            .order_by(models.ChangeLog.seq.desc()).limit(1),
+            "change_log", {"ix_change_log_user_id_seq"},
+        ),
+        (
+            "menu ETag version",
+            select(models.ChangeLog.seq).where(models.ChangeLog.entity == "food_item")
+            .order_by(models.ChangeLog.seq.desc()).limit(1),
+            "change_log", {"ix_change_log_entity_seq"},
+        ),
+        (
+            "rollup of a completed order",
+            rollup.sales_select([OrderDetails.order_id.in_([1])]),
+            "order_details", {"PRIMARY"},
+        ),
+    ]
+
+
+def used_indexes(conn, statement):
+    """Map table -> index name (None for a full scan) from the query plan."""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "mysql":
+        rows = conn.execute(text(f"EXPLAIN {sql}")).mappings().all()
+        return {row["table"]: row["key"] for row in rows}
+    # SQLite: "SEARCH orders USING INDEX ix_... (...)" / "SCAN orders"
+    used = {}
+    for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+        match = re.match(r"(SEARCH|SCAN) (\w+)(?: USING (?:COVERING )?INDEX (\w+)| USING (INTEGER )?PRIMARY KEY)?", row[-1])
+        if match:
+            _, table, index, _ = match.groups()
+            if (index or "").startswith("sqlite_autoindex_") or "PRIMARY KEY" in row[-1]:
+                index = "PRIMARY"  # Composite primary keys are backed by an autoindex
+            used[table] = index
+    return used
+
+
+def explain(engine):
+    """Print the index each hot query uses; return the names of those that miss."""
+    misses = []
+    with engine.connect() as conn:
+        for name, statement, table, expected in hot_queries():
+            index = used_indexes(conn, statement).get(table)
+            ok = index in expected
+            print(f"{'ok  ' if ok else 'MISS'} {name}: {table} uses {index or 'no index'}"
+                  f"{'' if ok else ' (expected ' + ' or '.join(sorted(expected)) + ')'}")
+            if not ok:
+                misses.append(name)
+    return misses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["upgrade", "current", "history", "explain"])
+    parser.add_argument("--strict", action="store_true", help="exit non-zero when a hot query misses its index")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        upgrade(engine, verbose=True)
+        print("Schema is up to date.")
+    elif args.command in ("current", "history"):
+        with engine.begin() as conn:
+            done = applied_versions(conn)
+        known = discover()
+        if args.command == "current":
+            print(max(done) if done else "No migrations applied.")
+        else:
+            for version, module in known:
+                print(f"[{'x' if version in done else ' '}] {version} {module.description}")
+    elif args.command == "explain":
+        misses = explain(engine)
+        if misses and args.strict:
+            raise SystemExit(f"{len(misses)} hot queries do not use their expected index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from sqlalchemy import Column, Date, ForeignKey, Integer, BigInteger, MetaData, String, Table
+
+description = "Tables as created by create_all before migrations existed"
+
+# Frozen copy of the original schema: later model changes must not leak in here
+metadata = MetaData()
+
+Table(
+    'categories', metadata,
+    Column('category_name', String(100), primary_key=True),
+    Column('addons', String(200)),
+    Column('removable_items', String(200)),
+)
+Table(
+    'food_items', metadata,
+    Column('food_id', Integer, primary_key=True),
+    Column('name', String(50), unique=True),
+    Column('price', Integer),
+    Column('description', String(200)),
+    Column('category_name', Integer, ForeignKey('categories.category_name')),
+    Column('price_to_make', Integer),
+    Column('photo', String(255)),
+)
+Table(
+    'users', metadata,
+    Column('user_id', BigInteger, primary_key=True),
+    Column('username', String(100), unique=True),
+    Column('phone_number', String(8)),
+    Column('password', String(255), nullable=False),
+    Column('address', String(255)),
+)
+Table(
+    'feedbacks', metadata,
+    Column('feedback_id', Integer, primary_key=True),
+    Column('stars', Integer),
+    Column('user_id', BigInteger, ForeignKey('users.user_id')),
+    Column('food_id', Integer, ForeignKey('food_items.food_id')),
+    Column('comment', String(500)),
+)
+Table(
+    'payments', metadata,
+    Column('payment_id', BigInteger, primary_key=True),
+    Column('payment_method', String(50)),
+    Column('payment_status', String(50)),
+    Column('transaction_id', String(100)),
+)
+Table(
+    'promo_codes', metadata,
+    Column('code', String(50), primary_key=True),
+    Column('discount', Integer),
+    Column('valid_from', Date),
+    Column('valid_to', Date),
+)
+Table(
+    'orders', metadata,
+    Column('order_id', BigInteger, primary_key=True),
+    Column('user_id', BigInteger, ForeignKey('users.user_id')),
+    Column('promo_code', String(50), ForeignKey('promo_codes.code')),
+    Column('total_food_price', Integer),
+    Column('delivery_fee', Integer),
+    Column('status', String(50)),
+    Column('order_date', Date),
+    Column('payment_id', BigInteger, ForeignKey('payments.payment_id')),
+)
+Table(
+    'order_details', metadata,
+    Column('order_id', BigInteger, ForeignKey('orders.order_id'), primary_key=True),
+    Column('food_id', Integer, ForeignKey('food_items.food_id'), primary_key=True),
+    Column('quantity', Integer),
+)
+Table(
+    'stats', metadata,
+    Column('stats_id', Integer, primary_key=True),
+    Column('total_income', Integer),
+    Column('plate_of_the_day', Integer, ForeignKey('food_items.food_id')),
+    Column('net_income', Integer),
+)
+Table(
+    'item_of_month', metadata,
+    Column('month', String(20), primary_key=True),
+    Column('plate_of_month', Integer, ForeignKey('food_items.food_id')),
+)
+Table(
+    'admins', metadata,
+    Column('admin_id', Integer, primary_key=True),
+    Column('username', String(100)),
+    Column('password', String(255)),
+)
+
+
+def upgrade(conn):
+    # Existing databases already have these; only missing tables are created
+    metadata.create_all(conn, checkfirst=True)
@@ -0,0 +1,17 @@
+from migrations import create_index, has_index_on
+
+description = "Composite indexes for cart, order listing, history and stats queries"
+
+
+def upgrade(conn):
+    # Every cart call: WHERE user_id = ? AND status = 'pending'
+    create_index(conn, 'orders', 'ix_orders_user_id_status', ['user_id', 'status'])
+    # Admin listing, best-seller and daily stats: order_date ranges, newest first
+    create_index(conn, 'orders', 'ix_orders_order_date_order_id', ['order_date', 'order_id'])
+    create_index(conn, 'orders', 'ix_orders_status_order_date_order_id', ['status', 'order_date', 'order_id'])
+    # Customer history: WHERE user_id = ? ORDER BY order_date, order_id
+    create_index(conn, 'orders', 'ix_orders_user_id_order_date_order_id', ['user_id', 'order_date', 'order_id'])
+    # Stats join order_details by food_id; the PK only leads with order_id.
+    # MySQL usually has one already from the foreign key.
+    if not has_index_on(conn, 'order_details', 'food_id'):
+        create_index(conn, 'order_details', 'ix_order_details_food_id', ['food_id'])
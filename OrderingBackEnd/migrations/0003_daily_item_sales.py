@@ -0,0 +1,38 @@
+from sqlalchemy import BigInteger, Column, Date, Integer, MetaData, Table, text
+
+from migrations import has_table
+
+description = "daily_item_sales rollup of sold orders, backfilled from history"
+
+metadata = MetaData()
+
+daily_item_sales = Table(
+    'daily_item_sales', metadata,
+    Column('date', Date, primary_key=True),
+    Column('food_id', Integer, primary_key=True),
+    Column('qty', Integer, nullable=False, default=0),
+    Column('revenue', BigInteger, nullable=False, default=0),
+    Column('cost', BigInteger, nullable=False, default=0),
+)
+
+# Frozen copy of rollup.backfill's query, so rerunning this migration later
+# doesn't depend on the current code
+BACKFILL = text("""
+    INSERT INTO daily_item_sales (date, food_id, qty, revenue, cost)
+    SELECT o.order_date, d.food_id,
+           COALESCE(SUM(d.quantity), 0),
+           COALESCE(SUM(d.quantity * f.price), 0),
+           COALESCE(SUM(d.quantity * f.price_to_make), 0)
+    FROM orders o
+    JOIN order_details d ON d.order_id = o.order_id
+    JOIN food_items f ON f.food_id = d.food_id
+    WHERE o.status IN ('completed', 'preparing', 'ready', 'delivered') AND o.order_date IS NOT NULL
+    GROUP BY o.order_date, d.food_id
+""")
+
+
+def upgrade(conn):
+    if has_table(conn, 'daily_item_sales'):
+        return
+    metadata.create_all(conn)
+    conn.execute(BACKFILL)
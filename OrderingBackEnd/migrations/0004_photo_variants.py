@@ -0,0 +1,8 @@
+from migrations import add_column
+
+description = "food_items.photo_variants for resized image URLs"
+
+
+def upgrade(conn):
+    # Nullable, filled in by images.py after upload or by its backfill command
+    add_column(conn, 'food_items', 'photo_variants TEXT NULL')
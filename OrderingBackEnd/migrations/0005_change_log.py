@@ -0,0 +1,57 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, text
+from sqlalchemy.dialects import mysql
+
+from migrations import has_table, has_trigger
+
+description = "change_log of orders and food_items, filled by triggers"
+
+metadata = MetaData()
+
+change_log = Table(
+    'change_log', metadata,
+    Column('seq', BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column('entity', String(20), nullable=False),
+    Column('entity_id', BigInteger, nullable=False),
+    Column('user_id', BigInteger),
+    Column('op', String(10), nullable=False),
+    Column('changed_at', DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=False),
+    # Retention pruning finds old entries from the start of the log
+    Index('ix_change_log_changed_at', 'changed_at'),
+    # Never reuse a seq, even after pruning empties the table
+    sqlite_autoincrement=True,
+)
+
+# (trigger name, event, table, entity, row the values come from, user_id column or None, op)
+TRIGGERS = [
+    ("orders_change_insert", "INSERT", "orders", "order", "NEW", "order_id", "user_id", "upsert"),
+    ("orders_change_update", "UPDATE", "orders", "order", "NEW", "order_id", "user_id", "upsert"),
+    ("orders_change_delete", "DELETE", "orders", "order", "OLD", "order_id", "user_id", "delete"),
+    ("food_items_change_insert", "INSERT", "food_items", "food_item", "NEW", "food_id", None, "upsert"),
+    ("food_items_change_update", "UPDATE", "food_items", "food_item", "NEW", "food_id", None, "upsert"),
+    ("food_items_change_delete", "DELETE", "food_items", "food_item", "OLD", "food_id", None, "delete"),
+]
+
+
+def trigger_ddl(dialect_name, name, event, table, entity, row, id_column, user_column, op):
+    user_id = f"{row}.{user_column}" if user_column else "NULL"
+    if dialect_name == "mysql":
+        now = "CURRENT_TIMESTAMP(6)"
+    else:
+        now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    insert = (
+        "INSERT INTO change_log (entity, entity_id, user_id, op, changed_at) "
+        f"VALUES ('{entity}', {row}.{id_column}, {user_id}, '{op}', {now})"
+    )
+    if dialect_name == "mysql":
+        return f"CREATE TRIGGER {name} AFTER {event} ON {table} FOR EACH ROW {insert}"
+    return f"CREATE TRIGGER {name} AFTER {event} ON {table} FOR EACH ROW BEGIN {insert}; END"
+
+
+def upgrade(conn):
+    # On MySQL with binary logging, creating triggers needs SUPER or
+    # log_bin_trust_function_creators=1
+    if not has_table(conn, 'change_log'):
+        metadata.create_all(conn)
+    for name, *spec in TRIGGERS:
+        if not has_trigger(conn, name):
+            conn.execute(text(trigger_ddl(conn.dialect.name, name, *spec)))
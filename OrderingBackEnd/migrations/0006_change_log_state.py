@@ -0,0 +1,21 @@
+from sqlalchemy import BigInteger, Column, Integer, MetaData, Table, insert, select
+
+from migrations import has_table
+
+description = "change_log_state: the highest change_log seq removed by pruning"
+
+metadata = MetaData()
+
+change_log_state = Table(
+    'change_log_state', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('pruned_seq', BigInteger, nullable=False),
+)
+
+
+def upgrade(conn):
+    if not has_table(conn, 'change_log_state'):
+        metadata.create_all(conn)
+    # A single row; positions below pruned_seq have lost changes
+    if conn.scalar(select(change_log_state.c.id).where(change_log_state.c.id == 1)) is None:
+        conn.execute(insert(change_log_state).values(id=1, pruned_seq=0))
@@ -0,0 +1,8 @@
+from migrations import create_index
+
+description = "Index on change_log (user_id, seq) for per-user ETags"
+
+
+def upgrade(conn):
+    # http_cache.user_tag: MAX(seq) WHERE user_id = ?, answered from the index alone
+    create_index(conn, 'change_log', 'ix_change_log_user_id_seq', ['user_id', 'seq'])
@@ -0,0 +1,10 @@
+import rollup
+
+description = "Rebuild daily_item_sales to count every sold status, not just completed"
+
+
+def upgrade(conn):
+    # 0003 only backfilled completed orders; preparing, ready and delivered
+    # ones were missing, so cancelling or deleting them took the totals
+    # below zero
+    rollup.rebuild(conn)
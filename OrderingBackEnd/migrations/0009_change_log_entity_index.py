@@ -0,0 +1,8 @@
+from migrations import create_index
+
+description = "Index on change_log (entity, seq) for the per-entity change feeds"
+
+
+def upgrade(conn):
+    # changes.read_log: WHERE entity = ? AND seq > ? ORDER BY seq
+    create_index(conn, 'change_log', 'ix_change_log_entity_seq', ['entity', 'seq'])
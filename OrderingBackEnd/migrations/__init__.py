@@ -0,0 +1,60 @@
+"""
+Versioned schema migrations, applied by `python migrate.py upgrade`.
+
+Each module is named NNNN_description.py and defines `description` and
+`upgrade(conn)`. Migrations must be additive and idempotent (check before
+creating) so they can run against a live database while the previous
+release is still serving: add tables, nullable columns and indexes first,
+ship the code that uses them, and only drop things in a later migration.
+"""
+from sqlalchemy import inspect, text
+
+
+def has_table(conn, table):
+    return inspect(conn).has_table(table)
+
+
+def has_column(conn, table, column):
+    return any(col["name"] == column for col in inspect(conn).get_columns(table))
+
+
+def has_index(conn, table, name):
+    return any(index["name"] == name for index in inspect(conn).get_indexes(table))
+
+
+def has_index_on(conn, table, leading_column):
+    """True if any index (or the primary key) starts with `leading_column`."""
+    inspector = inspect(conn)
+    primary_key = inspector.get_pk_constraint(table).get("constrained_columns") or []
+    if primary_key[:1] == [leading_column]:
+        return True
+    return any(index["column_names"][:1] == [leading_column] for index in inspector.get_indexes(table))
+
+
+def has_trigger(conn, name):
+    if conn.dialect.name == "mysql":
+        query = "SELECT 1 FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = :name"
+    else:
+        query = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name"
+    return conn.execute(text(query), {"name": name}).first() is not None
+
+
+def create_index(conn, table, name, columns):
+    """CREATE INDEX without blocking writes on MySQL (InnoDB online DDL)."""
+    if has_index(conn, table, name):
+        return
+    column_list = ", ".join(columns)
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({column_list}) ALGORITHM=INPLACE LOCK=NONE"))
+    else:
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({column_list})"))
+
+
+def add_column(conn, table, column_ddl):
+    """ALTER TABLE ... ADD COLUMN, online on MySQL. `column_ddl` starts with the column name."""
+    if has_column(conn, table, column_ddl.split()[0]):
+        return
+    if conn.dialect.name == "mysql":
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_ddl}, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column_ddl}"))
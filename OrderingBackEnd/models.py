@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, BigInteger, ForeignKey, Date, DateTime, Index, Text
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -12,6 +13,7 @@ class FoodItem(Base):
     category_name = Column(Integer, ForeignKey('categories.category_name'))
     price_to_make = Column(Integer)
     photo = Column(String(255))
+    photo_variants = Column(Text)  # JSON of resized image URLs, written by images.py
 
     category = relationship("Category", back_populates="food_items")
     feedbacks = relationship("Feedback", back_populates="food_item")
@@ -34,7 +36,7 @@ class Feedback(Base):
 class User(Base):
     __tablename__ = 'users'
 
-    user_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     username = Column(String(100), unique=True)
     phone_number = Column(String(8))
     password = Column(String(255), nullable=False)
@@ -46,8 +48,17 @@ class User(Base):
 
 class Orders(Base):
     __tablename__ = 'orders'
-
-    order_id = Column(BigInteger, primary_key=True)
+    __table_args__ = (
+        # Every cart call looks up the user's pending order
+        Index('ix_orders_user_id_status', 'user_id', 'status'),
+        # Keyset pagination of the admin listing, optionally by status
+        Index('ix_orders_order_date_order_id', 'order_date', 'order_id'),
+        Index('ix_orders_status_order_date_order_id', 'status', 'order_date', 'order_id'),
+        # Per-customer listing and history
+        Index('ix_orders_user_id_order_date_order_id', 'user_id', 'order_date', 'order_id'),
+    )
+
+    order_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     user_id = Column(BigInteger, ForeignKey('users.user_id'))
     promo_code = Column(String(50), ForeignKey('promo_codes.code'))
     total_food_price = Column(Integer)
@@ -83,6 +94,47 @@ class Stats(Base):
     plate_of_the_day_item = relationship("FoodItem")
 
 
+class DailyItemSales(Base):
+    """Per-day, per-item totals of completed orders, maintained by rollup.py."""
+    __tablename__ = 'daily_item_sales'
+
+    date = Column(Date, primary_key=True)
+    food_id = Column(Integer, primary_key=True)
+    qty = Column(Integer, nullable=False, default=0)
+    revenue = Column(BigInteger, nullable=False, default=0)
+    cost = Column(BigInteger, nullable=False, default=0)
+
+
+class ChangeLog(Base):
+    """One row per write to orders or food_items, appended by the triggers of migration 0005."""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        # Retention pruning finds old entries from the start of the log
+        Index('ix_change_log_changed_at', 'changed_at'),
+        # The menu and admin order feeds read one entity's changes after a position
+        Index('ix_change_log_entity_seq', 'entity', 'seq'),
+        # A customer's order feed, and the newest entry for their cart and history ETags
+        Index('ix_change_log_user_id_seq', 'user_id', 'seq'),
+        # Never reuse a seq, even after pruning empties the table
+        {'sqlite_autoincrement': True},
+    )
+
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity = Column(String(20), nullable=False)  # "order" or "food_item"
+    entity_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger)  # Owner of an order, so customers can follow their own
+    op = Column(String(10), nullable=False)  # "upsert" or "delete"
+    changed_at = Column(DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=False)
+
+
+class ChangeLogState(Base):
+    """Single row (id 1) holding the highest change_log seq that pruning has removed."""
+    __tablename__ = 'change_log_state'
+
+    id = Column(Integer, primary_key=True)
+    pruned_seq = Column(BigInteger, nullable=False, default=0)
+
+
 class ItemOfMonth(Base):
     __tablename__ = 'item_of_month'
 
@@ -103,7 +155,7 @@ class Admin(Base):
 class Payment(Base):
     __tablename__ = 'payments'
 
-    payment_id = Column(BigInteger, primary_key=True)
+    payment_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
     payment_method = Column(String(50))
     payment_status = Column(String(50))
     transaction_id = Column(String(100))
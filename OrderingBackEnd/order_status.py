@@ -0,0 +1,36 @@
+"""
+Order statuses and the moves staff may make between them.
+
+"pending" is a customer's open cart; only checkout (POST /orders/complete)
+takes it to "completed". From there the kitchen works the order through
+preparing, ready and delivered. Every status in SOLD counts towards the
+daily sales rollup, so an order leaves the rollup only when it is
+cancelled or deleted.
+"""
+PENDING = "pending"
+COMPLETED = "completed"
+PREPARING = "preparing"
+READY = "ready"
+DELIVERED = "delivered"
+CANCELLED = "cancelled"
+
+SOLD = (COMPLETED, PREPARING, READY, DELIVERED)
+
+# Status -> statuses staff may move it to
+TRANSITIONS = {
+    PENDING: set(),
+    COMPLETED: {PREPARING, READY, CANCELLED},
+    PREPARING: {READY, CANCELLED},
+    READY: {DELIVERED, PREPARING},
+    DELIVERED: set(),
+    CANCELLED: set(),
+}
+
+
+def is_sold(status):
+    return status in SOLD
+
+
+def sources(target):
+    """Statuses an order may be in to move to `target`."""
+    return {status for status, targets in TRANSITIONS.items() if target in targets}
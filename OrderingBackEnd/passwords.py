@@ -0,0 +1,147 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import bcrypt
+from fastapi import HTTPException, status
+
+# bcrypt releases the GIL, so threads scale across cores; "process" is there
+# for interpreters where that doesn't hold
+PASSWORD_EXECUTOR = os.getenv("PASSWORD_EXECUTOR", "thread")
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+# Requests allowed to wait for a worker before new ones get a 503
+PASSWORD_MAX_QUEUE = int(os.getenv("PASSWORD_MAX_QUEUE", str(PASSWORD_WORKERS * 8)))
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _timed(fn, *args):
+    # Wall clock, so a worker process' timestamps compare with ours
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+def _hash(password):
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms):
+        index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self):
+        histogram = {f"le_{bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)}
+        histogram["le_inf"] = self.buckets[-1]
+        return {
+            "count": self.count,
+            "avg": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max": round(self.max_ms, 3),
+            "histogram": histogram,
+        }
+
+
+class PasswordHasher:
+    """
+    bcrypt work on a dedicated, size-limited executor so it never runs on
+    the event loop. At most `workers` hashes run at once and `max_queue`
+    more may wait; beyond that callers get a 503 instead of piling up.
+    """
+
+    def __init__(self, workers=PASSWORD_WORKERS, max_queue=PASSWORD_MAX_QUEUE, kind=PASSWORD_EXECUTOR):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"PASSWORD_EXECUTOR must be 'thread' or 'process', not {kind!r}")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait = LatencyHistogram()
+        self.run_time = LatencyHistogram()
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn: forking a process that holds DB connections and event loop state is unsafe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server busy, please try again",
+                    headers={"Retry-After": "1"},
+                )
+            self.in_flight += 1
+
+        submitted = time.time()
+        future = self._get_executor().submit(_timed, fn, *args)
+        # Released when the work finishes, even if the request was cancelled
+        future.add_done_callback(self._release)
+        result, started, finished = await asyncio.wrap_future(future)
+        with self._lock:
+            self.queue_wait.record((started - submitted) * 1000)
+            self.run_time.record((finished - started) * 1000)
+        return result
+
+    async def hash(self, password):
+        return (await self.run(_hash, password.encode("utf-8"))).decode("utf-8")
+
+    async def verify(self, password, hashed):
+        return await self.run(_check, password.encode("utf-8"), hashed.encode("utf-8"))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executor": self.kind,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_wait_ms": self.queue_wait.snapshot(),
+                "run_ms": self.run_time.snapshot(),
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (milliseconds) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Every instrumented engine registers its stats here, keyed by name
+registry = {}
+
+
+class PoolStats:
+    """Counters fed by the pool events of a single engine."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_count = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def record_wait(self, seconds):
+        waited_ms = seconds * 1000
+        index = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if waited_ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self.wait_buckets[index] += 1
+            self.wait_count += 1
+            self.wait_total_ms += waited_ms
+            self.wait_max_ms = max(self.wait_max_ms, waited_ms)
+
+    def increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool):
+        with self._lock:
+            histogram = {f"le_{bound}ms": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)}
+            histogram["le_inf"] = self.wait_buckets[-1]
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "timeouts": self.timeouts,
+                "churn": {
+                    "connects": self.connects,
+                    "closes": self.closes,
+                    "invalidations": self.invalidations,
+                },
+                "wait_ms": {
+                    "count": self.wait_count,
+                    "avg": round(self.wait_total_ms / self.wait_count, 3) if self.wait_count else 0.0,
+                    "max": round(self.wait_max_ms, 3),
+                    "histogram": histogram,
+                },
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+            }
+
+
+class _WaitTimingMixin:
+    """Times Pool.connect(), i.e. how long a caller waited for a connection."""
+
+    stats = None
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.increment("timeouts")
+            raise
+        if self.stats is not None:
+            self.stats.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # dispose() and invalidation swap in a fresh pool; keep the same counters
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(engine, name):
+    """
+    Attach a PoolStats to a sync Engine (pass async_engine.sync_engine for
+    async engines) and subscribe it to the pool events.
+    """
+    stats = PoolStats(name)
+    engine.pool.stats = stats
+    registry[name] = (engine, stats)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        stats.increment("connects")
+
+    @event.listens_for(engine, "close")
+    def on_close(dbapi_connection, connection_record):
+        stats.increment("closes")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.increment("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.increment("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        stats.increment("invalidations")
+
+    return stats
+
+
+def snapshot_all():
+    return {name: stats.snapshot(engine.pool) for name, (engine, stats) in registry.items()}
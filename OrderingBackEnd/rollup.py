@@ -0,0 +1,95 @@
+"""
+daily_item_sales: per-day, per-item quantity, revenue and cost of sold
+orders (order_status.SOLD), so the stats and best-seller endpoints never
+scan order_details.
+
+Every status change into or out of a sold status (and every delete of a
+sold order) must execute record_orders() in the same transaction.
+Revenue and cost are valued at the menu prices current when the order is
+recorded.
+
+    python rollup.py backfill    rebuild the table from all order history
+"""
+import argparse
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+import order_status
+from database import engine
+
+sales = models.DailyItemSales.__table__
+COLUMNS = ["date", "food_id", "qty", "revenue", "cost"]
+
+
+def sales_select(conditions, sign=1):
+    """Order lines matching `conditions`, grouped by day and item."""
+    Orders, OrderDetails, FoodItem = models.Orders, models.OrderDetails, models.FoodItem
+    return (
+        select(
+            Orders.order_date,
+            OrderDetails.food_id,
+            func.coalesce(func.sum(OrderDetails.quantity), 0) * sign,
+            func.coalesce(func.sum(OrderDetails.quantity * FoodItem.price), 0) * sign,
+            func.coalesce(func.sum(OrderDetails.quantity * FoodItem.price_to_make), 0) * sign,
+        )
+        .join(Orders, OrderDetails.order_id == Orders.order_id)
+        .join(FoodItem, FoodItem.food_id == OrderDetails.food_id)
+        .where(Orders.order_date.is_not(None), *conditions)
+        .group_by(Orders.order_date, OrderDetails.food_id)
+    )
+
+
+def record_orders(dialect_name, order_ids, sign=1):
+    """
+    INSERT ... SELECT adding (sign=1) or removing (sign=-1) the given orders'
+    lines to the rollup in one statement. Execute it before committing the
+    status change it accounts for.
+    """
+    source = sales_select([models.OrderDetails.order_id.in_(order_ids)], sign)
+    if dialect_name == "mysql":
+        stmt = mysql_insert(sales).from_select(COLUMNS, source)
+        return stmt.on_duplicate_key_update(
+            qty=sales.c.qty + stmt.inserted.qty,
+            revenue=sales.c.revenue + stmt.inserted.revenue,
+            cost=sales.c.cost + stmt.inserted.cost,
+        )
+    # SQLite stand-in used for local runs
+    stmt = sqlite_insert(sales).from_select(COLUMNS, source)
+    return stmt.on_conflict_do_update(
+        index_elements=[sales.c.date, sales.c.food_id],
+        set_={
+            "qty": sales.c.qty + stmt.excluded.qty,
+            "revenue": sales.c.revenue + stmt.excluded.revenue,
+            "cost": sales.c.cost + stmt.excluded.cost,
+        },
+    )
+
+
+def rebuild(conn):
+    """Replace the whole rollup in one GROUP BY pass over order history, in conn's transaction."""
+    conn.execute(delete(sales))
+    result = conn.execute(
+        insert(sales).from_select(COLUMNS, sales_select([models.Orders.status.in_(order_status.SOLD)]))
+    )
+    return result.rowcount
+
+
+def backfill(engine):
+    """Rebuild the whole rollup in its own transaction."""
+    with engine.begin() as conn:
+        return rebuild(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+    rows = backfill(engine)
+    print(f"Rebuilt daily_item_sales: {rows} rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Static file serving for menu photos.
+
+Uploads are stored under content-hashed names (uploads.fingerprinted_name),
+and their variants derive from those names, so a fingerprinted URL never
+changes content. Those are served as immutable for a year. Anything else,
+such as photos from before fingerprinting, keeps the usual revalidation.
+
+/static/images is served by MappedImageFiles (STATIC_IMAGE_MODE=mmap, the
+default): hot images stay memory-mapped within an LRU byte budget and are
+sent straight from the mapping. STATIC_IMAGE_MODE=files serves them with
+plain StaticFiles instead.
+
+    python static_files.py fingerprint    rename legacy photos to hashed names
+"""
+import argparse
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import shutil
+from collections import OrderedDict
+from email.utils import formatdate
+
+from sqlalchemy import select, update
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+import models
+import uploads
+from database import engine
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+STATIC_IMAGE_MODE = os.getenv("STATIC_IMAGE_MODE", "mmap")
+# Total bytes of images kept mapped, and the largest single file worth mapping
+IMAGE_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+IMAGE_CACHE_MAX_FILE_BYTES = 8 * 1024 * 1024
+
+# name.<16 hex>.ext or name.<16 hex>-<variant>.ext
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{%d}(?:-[a-z]+)?\.[a-z]+$" % uploads.FINGERPRINT_LENGTH)
+
+
+def is_fingerprinted(path):
+    return FINGERPRINTED.search(os.fspath(path)) is not None
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles that lets browsers and proxies keep fingerprinted files without revalidating."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        if is_fingerprinted(full_path):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class MappedImage:
+    """One memory-mapped file with its response headers worked out up front."""
+
+    def __init__(self, path, fingerprinted):
+        self.path = path
+        self.fingerprinted = fingerprinted
+        self.file = open(path, "rb")
+        try:
+            stat_result = os.fstat(self.file.fileno())
+            self.size = stat_result.st_size
+            self.mtime_ns = stat_result.st_mtime_ns
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.file.close()
+            raise
+        self.etag = f'"{self.mtime_ns:x}-{self.size:x}"'
+        self.headers = {
+            "content-type": mimetypes.guess_type(path)[0] or "application/octet-stream",
+            "etag": self.etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+        }
+        if fingerprinted:
+            self.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+
+    def is_current(self):
+        # Fingerprinted names never change content; others are checked per hit
+        if self.fingerprinted:
+            return True
+        try:
+            stat_result = os.stat(self.path)
+        except OSError:
+            return False
+        return stat_result.st_mtime_ns == self.mtime_ns and stat_result.st_size == self.size
+
+    def close(self):
+        """Unmap; False while a response still holds a view of the mapping."""
+        try:
+            self.map.close()
+        except BufferError:
+            return False
+        self.file.close()
+        return True
+
+
+class ImageCache:
+    """LRU of MappedImage objects bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES, max_file_bytes=IMAGE_CACHE_MAX_FILE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries = OrderedDict()
+        self._retired = []  # Evicted maps still being sent
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        entry = self._entries.get(path)
+        if entry is not None and not entry.is_current():
+            self._drop(path)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(path)
+        return entry
+
+    def put(self, entry):
+        self._drop(entry.path)
+        self._entries[entry.path] = entry
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            self._drop(next(iter(self._entries)))
+        self._retired = [old for old in self._retired if not old.close()]
+
+    def _drop(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.bytes -= entry.size
+            if not entry.close():
+                self._retired.append(entry)
+
+    def invalidate(self, path=None):
+        """Forget one file (after it is rewritten), or everything."""
+        for cached in ([os.path.realpath(path)] if path else list(self._entries)):
+            self._drop(cached)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "files": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "retired": len(self._retired),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+image_cache = ImageCache()
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range, None to send it all, or "invalid"."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None  # Multiple ranges: answering with the whole file is allowed
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    try:
+        if start:
+            first = int(start)
+            last = min(int(end), size - 1) if end else size - 1
+        else:
+            first = max(size - int(end), 0)  # Suffix range: the last N bytes
+            last = size - 1
+    except ValueError:
+        return None
+    if first > last or first >= size:
+        return "invalid"
+    return first, last
+
+
+class MappedImageFiles:
+    """
+    ASGI app serving a directory of images from memory-mapped files, with
+    precomputed ETags, conditional GETs and single byte ranges. Bodies are
+    sent as memoryview slices of the mapping, or with the server's
+    zerocopysend extension when it offers one. Anything it can't serve
+    (unknown paths, other methods, huge files) goes to `fallback`.
+    """
+
+    def __init__(self, directory, fallback, cache=image_cache):
+        self.directory = os.path.realpath(directory)
+        self.fallback = fallback
+        self.cache = cache
+
+    def resolve(self, scope):
+        relative = scope["path"][len(scope.get("root_path", "")):].lstrip("/")
+        full_path = os.path.realpath(os.path.join(self.directory, relative))
+        if os.path.commonpath([full_path, self.directory]) != self.directory:
+            return None
+        return full_path
+
+    async def __call__(self, scope, receive, send):
+        path = self.resolve(scope) if scope["type"] == "http" and scope["method"] in ("GET", "HEAD") else None
+        if path is None:
+            return await self.fallback(scope, receive, send)
+
+        entry = self.cache.get(path)
+        if entry is None:
+            try:
+                entry = await run_in_threadpool(self._load, path)
+            except (OSError, ValueError):
+                entry = None  # Missing, a directory, or empty: let StaticFiles answer
+            if entry is None:
+                return await self.fallback(scope, receive, send)
+            self.cache.put(entry)
+
+        await self.respond(entry, scope, send)
+
+    def _load(self, path):
+        if os.path.getsize(path) > self.cache.max_file_bytes:
+            return None
+        return MappedImage(path, is_fingerprinted(path))
+
+    async def respond(self, entry, scope, send):
+        request_headers = Headers(scope=scope)
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or entry.etag in
+                              {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}):
+            await Response(status_code=304, headers={
+                key: value for key, value in entry.headers.items() if key in ("etag", "cache-control")
+            })(scope, None, send)
+            return
+
+        byte_range = None
+        if_range = request_headers.get("if-range")
+        if if_range is None or if_range.strip() == entry.etag:
+            byte_range = parse_range(request_headers.get("range"), entry.size)
+        if byte_range == "invalid":
+            await Response(status_code=416, headers={"content-range": f"bytes */{entry.size}"})(scope, None, send)
+            return
+
+        status_code, first, last = 200, 0, entry.size - 1
+        headers = dict(entry.headers)
+        if byte_range is not None:
+            status_code, (first, last) = 206, byte_range
+            headers["content-range"] = f"bytes {first}-{last}/{entry.size}"
+        headers["content-length"] = str(last - first + 1)
+
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        })
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        # The view pins the entry until the send returns: if it is evicted
+        # or invalidated meanwhile, close() fails and the cache retires it
+        # instead of unmapping it and closing the fd under the send
+        with memoryview(entry.map) as pinned:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": entry.file.fileno(),
+                    "offset": first,
+                    "count": last - first + 1,
+                })
+            else:
+                await send({"type": "http.response.body", "body": pinned[first:last + 1]})
+
+
+def image_files(directory, fallback):
+    """The ASGI app to mount at /static/images for the configured STATIC_IMAGE_MODE."""
+    if STATIC_IMAGE_MODE == "files":
+        return fallback
+    return MappedImageFiles(directory, fallback)
+
+
+def fingerprint(engine, directory=uploads.IMAGE_DIR):
+    """
+    Copy each food item's un-hashed photo to its fingerprinted name and point
+    the row at it. The old file stays so cached pages keep working; variants
+    are cleared so `python images.py backfill` renders them under the new name.
+    """
+    with engine.connect() as conn:
+        items = conn.execute(
+            select(models.FoodItem.food_id, models.FoodItem.photo).where(models.FoodItem.photo.is_not(None))
+        ).all()
+
+    renamed = 0
+    for food_id, photo in items:
+        source = os.path.join(directory, os.path.basename(photo))
+        if is_fingerprinted(photo) or not os.path.exists(source):
+            continue
+        digest = hashlib.sha256()
+        with open(source, "rb") as file:
+            for chunk in iter(lambda: file.read(uploads.CHUNK_SIZE), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        stem, extension = os.path.splitext(os.path.basename(photo))
+        file_name = uploads.fingerprinted_name(stem, digest, extension.lower())
+        temp_path = os.path.join(directory, f".{file_name}.part")
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, os.path.join(directory, file_name))
+        with engine.begin() as conn:
+            conn.execute(
+                update(models.FoodItem.__table__)
+                .where(models.FoodItem.food_id == food_id)
+                .values(photo=f"/images/{file_name}", photo_variants=None)
+            )
+        renamed += 1
+    return renamed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["fingerprint"])
+    parser.parse_args()
+    print(f"Fingerprinted {fingerprint(engine)} photos.")
+
+
+if __name__ == "__main__":
+    main()
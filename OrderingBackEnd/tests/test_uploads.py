@@ -0,0 +1,55 @@
+"""
+Run from OrderingBackEnd:
+
+    python -m pytest tests
+"""
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import uploads
+
+MB = 1024 * 1024
+
+
+def make_client(monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 1 * MB)
+    monkeypatch.setattr(uploads, "MAX_BULK_UPLOAD_BYTES", 3 * MB)
+    app = FastAPI()
+
+    @app.post("/fooditems/")
+    @app.post("/fooditems/bulk")
+    async def receive(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(uploads.UploadLimitMiddleware)
+    return TestClient(app)
+
+
+def chunks(total, size=256 * 1024):
+    # A generator body goes out chunked, without Content-Length
+    for start in range(0, total, size):
+        yield b"x" * min(size, total - start)
+
+
+def test_declared_length_over_the_bulk_limit(monkeypatch):
+    response = make_client(monkeypatch).post("/fooditems/bulk", content=b"x" * (4 * MB))
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Upload too large; the limit is 3 MB."
+
+
+def test_streamed_body_over_the_bulk_limit(monkeypatch):
+    response = make_client(monkeypatch).post("/fooditems/bulk", content=chunks(4 * MB))
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Upload too large; the limit is 3 MB."
+
+
+def test_streamed_body_over_the_photo_limit(monkeypatch):
+    response = make_client(monkeypatch).post("/fooditems/", content=chunks(2 * MB))
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Upload too large; the limit is 1 MB."
+
+
+def test_bulk_body_under_its_limit(monkeypatch):
+    response = make_client(monkeypatch).post("/fooditems/bulk", content=chunks(2 * MB))
+    assert response.status_code == 200
+    assert response.json() == {"size": 2 * MB}
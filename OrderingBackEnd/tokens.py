@@ -0,0 +1,215 @@
+"""
+Stateless session tokens: `<kid>.<payload>.<signature>`, where payload is
+base64url JSON {"uid", "adm", "iat", "exp", "jti"} and the signature is
+HMAC-SHA256 over "<kid>.<payload>" with the key named by kid.
+
+Verification needs no database round trip: a dict lookup for the key, one
+HMAC, and set/dict lookups for revocation.
+
+Keys come from TOKEN_KEYS="kid1:secret1,kid2:secret2". New tokens are
+signed with TOKEN_ACTIVE_KID (default: the first key); the others still
+verify, so rotate by adding a key, making it active, and dropping the old
+one once TOKEN_TTL_SECONDS has passed. Without TOKEN_KEYS a random key is
+generated, so tokens stop working on restart and aren't shared between
+workers.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+TOKEN_TTL_SECONDS = int(os.getenv("TOKEN_TTL_SECONDS", str(12 * 3600)))
+# Let requests without a bearer token act for the user_id they send. Off by
+# default: anyone could then read or change any customer's cart and orders.
+# Only for old clients that can't send tokens yet.
+ALLOW_BARE_USER_ID = os.getenv("TOKEN_ALLOW_BARE_USER_ID", "false").lower() in ("1", "true", "yes")
+
+
+def _load_keys():
+    keys = {}
+    for entry in filter(None, (part.strip() for part in os.getenv("TOKEN_KEYS", "").split(","))):
+        kid, _, secret = entry.partition(":")
+        if not kid or not secret:
+            raise ValueError("TOKEN_KEYS entries must look like kid:secret")
+        keys[kid] = secret.encode("utf-8")
+    if not keys:
+        keys["local"] = secrets.token_bytes(32)
+    return keys
+
+
+KEYS = _load_keys()
+ACTIVE_KID = os.getenv("TOKEN_ACTIVE_KID") or next(iter(KEYS))
+if ACTIVE_KID not in KEYS:
+    raise ValueError(f"TOKEN_ACTIVE_KID {ACTIVE_KID!r} is not in TOKEN_KEYS")
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(key, message):
+    return _b64encode(hmac.new(key, message.encode(), hashlib.sha256).digest())
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class Revocations:
+    """
+    In-memory revocation: single tokens by jti, or every token of a subject
+    issued before a point in time (logout everywhere, password change).
+    Per process only, like the other in-memory state.
+    """
+
+    def __init__(self):
+        self._tokens = {}  # jti -> exp, pruned once expired
+        self._subjects = {}  # (adm, uid) -> revoked-before timestamp
+        self._lock = threading.Lock()
+
+    def revoke(self, claims):
+        now = time.time()
+        with self._lock:
+            if len(self._tokens) > 1024:
+                self._tokens = {jti: exp for jti, exp in self._tokens.items() if exp > now}
+            self._tokens[claims["jti"]] = claims["exp"]
+
+    def revoke_subject(self, uid, admin=False):
+        with self._lock:
+            self._subjects[(admin, uid)] = time.time()
+
+    def is_revoked(self, claims):
+        if claims["jti"] in self._tokens:
+            return True
+        revoked_before = self._subjects.get((bool(claims["adm"]), claims["uid"]))
+        return revoked_before is not None and claims["iat"] <= revoked_before
+
+
+revocations = Revocations()
+
+
+def issue(uid, admin=False, ttl=TOKEN_TTL_SECONDS):
+    now = int(time.time())
+    claims = {"uid": uid, "adm": int(admin), "iat": now, "exp": now + ttl, "jti": secrets.token_hex(8)}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    message = f"{ACTIVE_KID}.{payload}"
+    return f"{message}.{_sign(KEYS[ACTIVE_KID], message)}"
+
+
+def verify(token):
+    """Claims of a valid, unexpired, unrevoked token; InvalidToken otherwise."""
+    try:
+        kid, payload, signature = token.split(".")
+    except ValueError:
+        raise InvalidToken("Malformed token")
+    key = KEYS.get(kid)
+    if key is None:
+        raise InvalidToken("Unknown signing key")
+    if not hmac.compare_digest(signature, _sign(key, f"{kid}.{payload}")):
+        raise InvalidToken("Bad signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise InvalidToken("Malformed token")
+    if claims["exp"] < time.time():
+        raise InvalidToken("Token expired")
+    if revocations.is_revoked(claims):
+        raise InvalidToken("Token revoked")
+    return claims
+
+
+bearer = HTTPBearer(auto_error=False)
+
+
+def _unauthorized(detail):
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def optional_claims(credentials: HTTPAuthorizationCredentials | None = Depends(bearer)):
+    """
+    Claims of the bearer token, or None when no bearer token is sent, for
+    endpoints that decide with resolve_user. A token that is sent but
+    invalid, expired or revoked gets 401 rather than falling back to a
+    user_id, so a logged-out or forged session can't act as another user.
+    """
+    if credentials is None:
+        return None
+    try:
+        return verify(credentials.credentials)
+    except InvalidToken as exc:
+        raise _unauthorized(str(exc))
+
+
+def require_claims(credentials: HTTPAuthorizationCredentials | None = Depends(bearer)):
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    try:
+        return verify(credentials.credentials)
+    except InvalidToken as exc:
+        raise _unauthorized(str(exc))
+
+
+def require_admin(claims: dict = Depends(require_claims)):
+    if not claims["adm"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+    return claims
+
+
+def optional_stream_claims(
+    access_token: str | None = None,
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer),
+):
+    """
+    optional_claims for Server-Sent Event streams. Browsers' EventSource
+    can't send headers, so the token may come as ?access_token= instead
+    (where it can end up in access logs until it expires).
+    """
+    token = credentials.credentials if credentials is not None else access_token
+    if token is None:
+        return None
+    try:
+        return verify(token)
+    except InvalidToken as exc:
+        raise _unauthorized(str(exc))
+
+
+def require_stream_admin(claims: dict | None = Depends(optional_stream_claims)):
+    if claims is None:
+        raise _unauthorized("Not authenticated")
+    return require_admin(claims)
+
+
+def resolve_user(claims, user_id=None):
+    """
+    The user a request acts for: the customer token's user, which an
+    explicit user_id must match, or the user_id an admin token names.
+    Without a token it is 401, unless TOKEN_ALLOW_BARE_USER_ID is set.
+    """
+    if claims is None:
+        if not ALLOW_BARE_USER_ID:
+            raise _unauthorized("Not authenticated")
+        if user_id is None:
+            raise _unauthorized("user_id or a bearer token is required")
+        return user_id
+    if not claims["adm"]:
+        if user_id is not None and user_id != claims["uid"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token does not belong to this user")
+        return claims["uid"]
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="user_id is required with an admin token")
+    return user_id
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import tempfile
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+IMAGE_DIR = "static/images"
+
+# Largest photo accepted, and the multipart overhead allowed on top of it
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+FORM_OVERHEAD_BYTES = 64 * 1024
+# Bulk menu imports carry a CSV/NDJSON file plus a zip of many photos
+MAX_BULK_UPLOAD_BYTES = int(os.getenv("MAX_BULK_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+CHUNK_SIZE = 256 * 1024
+
+# Hex digits of the content hash put in file names
+FINGERPRINT_LENGTH = 16
+
+
+def too_large(max_bytes=MAX_UPLOAD_BYTES):
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Upload too large; the limit is {max_bytes // (1024 * 1024)} MB.",
+    )
+
+
+class UploadLimitMiddleware:
+    """
+    Rejects oversized request bodies on upload routes with 413 before they
+    are parsed: up front when Content-Length is too big, otherwise as soon
+    as the streamed body passes the limit.
+
+    `limits` maps path prefixes to their body limit; the longest matching
+    prefix wins.
+    """
+
+    def __init__(self, app, limits=None):
+        self.app = app
+        if limits is None:
+            limits = {
+                "/fooditems": MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES,
+                "/fooditems/bulk": MAX_BULK_UPLOAD_BYTES + FORM_OVERHEAD_BYTES,
+            }
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def limit_for(self, path):
+        for prefix, max_body in self.limits:
+            if path.startswith(prefix):
+                return max_body
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_body = self.limit_for(scope["path"]) if scope["type"] == "http" else None
+        if max_body is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > max_body:
+            # Don't read a byte of it
+            error = too_large(max_body - FORM_OVERHEAD_BYTES)
+            response = JSONResponse(
+                {"detail": error.detail}, status_code=error.status_code, headers={"Connection": "close"}
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body:
+                    # Raised inside the body parser; FastAPI turns it into the 413 response
+                    raise too_large(max_body - FORM_OVERHEAD_BYTES)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def fingerprinted_name(stem, digest, extension):
+    """`Classic_Burger.3f2a9c1b0e4d5a6f.jpg`: the name changes whenever the content does."""
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{extension}"
+
+
+def _copy_to_temp(source, directory, max_bytes):
+    """Copy `source` into a temp file in `directory` chunk by chunk; return (path, sha256 hex)."""
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as target:
+            size = 0
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large(max_bytes)
+                digest.update(chunk)
+                target.write(chunk)
+        return temp_path, digest.hexdigest()
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def store_file(source, stem, extension, directory=IMAGE_DIR, max_bytes=MAX_UPLOAD_BYTES):
+    """Blocking counterpart of save_upload() for any readable file object, such as a zip member."""
+    temp_path, digest = _copy_to_temp(source, directory, max_bytes)
+    file_name = fingerprinted_name(stem, digest, extension)
+    try:
+        os.replace(temp_path, os.path.join(directory, file_name))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return file_name
+
+
+async def save_upload(upload, stem, extension, directory=IMAGE_DIR, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Stream an UploadFile into `directory` off the event loop, under a name
+    carrying a hash of its content, and return that file name.
+
+    A given name only ever holds one content, so it can be cached forever,
+    and the file appears atomically: never half-written.
+    """
+    return await run_in_threadpool(store_file, upload.file, stem, extension, directory, max_bytes)
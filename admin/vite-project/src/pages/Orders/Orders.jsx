@@ -5,12 +5,18 @@ import { toast } from "react-toastify";
 
 const Orders = ({ url }) => {
   const [orders, setOrders] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
 
-  // Fetch all orders from the backend
-  const fetchOrders = async () => {
+  // Fetch a page of orders from the backend (first page when no cursor)
+  const fetchOrders = async (cursor = null) => {
     try {
-      const response = await axios.get(`${url}/orders/`);
-      setOrders(response.data); // Assuming response is already the list of orders
+      const response = await axios.get(`${url}/orders/`, {
+        params: cursor ? { cursor } : {},
+      });
+      setOrders((prev) =>
+        cursor ? [...prev, ...response.data.items] : response.data.items
+      );
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       toast.error("Error fetching orders");
       console.error(error);
@@ -42,6 +48,42 @@ const Orders = ({ url }) => {
     fetchOrders();
   }, []);
 
+  // Apply order changes pushed by the server instead of re-fetching the list
+  useEffect(() => {
+    const token = localStorage.getItem("token");
+    // EventSource can't send headers, so the token goes in the query string
+    const source = new EventSource(
+      `${url}/admin/orders/events?access_token=${encodeURIComponent(token)}`
+    );
+
+    source.addEventListener("order.status", (event) => {
+      const change = JSON.parse(event.data);
+      setOrders((prev) =>
+        prev.map((order) =>
+          order.order_id === change.order_id ? { ...order, status: change.status } : order
+        )
+      );
+    });
+    source.addEventListener("order.deleted", (event) => {
+      const change = JSON.parse(event.data);
+      setOrders((prev) => prev.filter((order) => order.order_id !== change.order_id));
+    });
+    // Update the order in place if it's listed, otherwise put it on top;
+    // the pages already loaded stay
+    source.addEventListener("order.completed", (event) => {
+      const change = JSON.parse(event.data);
+      setOrders((prev) =>
+        prev.some((order) => order.order_id === change.order_id)
+          ? prev.map((order) => (order.order_id === change.order_id ? change.order : order))
+          : [change.order, ...prev]
+      );
+    });
+    // Missed events (server restart, long disconnect): reload the first page
+    source.addEventListener("reset", () => fetchOrders());
+
+    return () => source.close();
+  }, [url]);
+
   return (
     <div className="orders-container">
       <div className="orders-title">
@@ -76,6 +118,11 @@ const Orders = ({ url }) => {
           </div>
         ))}
       </div>
+      {nextCursor && (
+        <button className="load-more-button" onClick={() => fetchOrders(nextCursor)}>
+          Load more
+        </button>
+      )}
     </div>
   );
 };
@@ -24,6 +24,7 @@ const FoodDisplay = ({ category }) => {
             description={item.description}
             price={item.price}
             image={item.photo} // Ensure 'photo' is the correct field from the API
+            variants={item.photo_variants} // Resized copies, when the backend has rendered them
           />
         ))}
       </div>
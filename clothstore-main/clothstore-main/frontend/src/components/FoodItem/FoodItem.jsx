@@ -3,16 +3,40 @@ import "./FoodItem.css";
 import { StoreContext } from "../../context/StoreContext";
 import { assets } from "../../assets/assets";
 
-const FoodItem = ({ id, name, price, description, image }) => {
+const STATIC_URL = "http://localhost:8000/static";
+
+// "url 160w, url 480w, ..." for one format of the resized variants
+const srcSet = (variants, format) =>
+  ["thumb", "card", "full"]
+    .map((size) => `${STATIC_URL}${variants[size][format]} ${variants[size].width}w`)
+    .join(", ");
+
+const FoodItem = ({ id, name, price, description, image, variants }) => {
   const { cartItems, addToCart, removeFromCart } = useContext(StoreContext);
   const itemQuantity = cartItems[id];
 
-  const imageUrl = `http://localhost:8000/static/${image}`;
+  const imageUrl = `${STATIC_URL}/${image}`;
 
   return (
     <div className="food-item">
       <div className="food-item-img-container">
-        <img className="food-item-image" src={imageUrl} alt={name} />
+        {variants ? (
+          // Let the browser pick the smallest variant that fills the card
+          <picture>
+            <source type="image/webp" srcSet={srcSet(variants, "webp")} sizes="(max-width: 600px) 100vw, 480px" />
+            <img
+              className="food-item-image"
+              src={`${STATIC_URL}${variants.card.jpeg}`}
+              srcSet={srcSet(variants, "jpeg")}
+              sizes="(max-width: 600px) 100vw, 480px"
+              alt={name}
+              loading="lazy"
+              style={{ backgroundImage: `url(${variants.placeholder})`, backgroundSize: "cover" }}
+            />
+          </picture>
+        ) : (
+          <img className="food-item-image" src={imageUrl} alt={name} />
+        )}
         <div className="food-item-count">
           {/* Plus button for adding to cart */}
           <img
@@ -41,7 +41,7 @@ const StoreContextProvider = (props) => {
           "Content-Type": "application/json",
           Authorization: `Bearer ${token}`, // Include token if required
         },
-        body: JSON.stringify({ food_id, quantity, user_id: 1 }), // Add user_id to the body
+        body: JSON.stringify({ food_id, quantity }), // The token identifies the user
       });
       const data = await response.json();
       if (response.ok) {
@@ -66,7 +66,7 @@ const StoreContextProvider = (props) => {
           "Content-Type": "application/json",
           Authorization: `Bearer ${token}`, // Include token if required
         },
-        body: JSON.stringify({ food_id, user_id: 1 }), // Replace 1 with dynamic user_id if needed
+        body: JSON.stringify({ food_id }), // The token identifies the user
       });
 
       const data = await response.json();
@@ -88,7 +88,10 @@ const Cart = () => {
 
         {food_list.map((item, index) => {
           if (cartItems[item.food_id] > 0) {
-            const imageUrl = `http://localhost:8000/static/${item.photo}`;
+            // The thumbnail variant is plenty for the cart row
+            const imageUrl = item.photo_variants
+              ? `http://localhost:8000/static${item.photo_variants.thumb.jpeg}`
+              : `http://localhost:8000/static/${item.photo}`;
 
             return (
               <div key={index} className="cart-items-item">